@@ -28,18 +28,47 @@ considered to be a warning. Print it to stderr.
 
 Anything leftover is considred to be errors, printed to stdout.
 
+A FILENAME of - reads the log from stdin, e.g. piped from the build, and
+reports it as it arrives: only the lines the longest multiline regex
+can span are held back.
+
 """
 import argparse
 import logging
 import mmap
+import multiprocessing
 import os
+import pickle
 import re
-import sre_constants
 import sys
+import time
 import traceback
 
+try:
+    # sre_parse is deprecated since Python 3.11
+    from re import _parser as sre_parse
+except ImportError:
+    import sre_parse
+
 exclude_regexs = []
 
+# the blocks of the configuration files, as (regex, comment, origin,
+# flags, anchor), and the (path, mtime) of the files and directories
+# they were read from
+config_entries = []
+config_stamps = []
+
+# version of the format of the pattern cache
+CACHE_VERSION = 1
+
+# most bytes read at once from a stream; the data read is filtered before
+# reading more, so the output follows the input as it arrives
+STREAM_READ = 1 << 16
+
+# the anchors of the regexs that have one, and the regex finding them
+anchors = []
+anchor_regex = None
+
 # first is a list of one or more comment lines
 # followed by a list of non-comments which describe a multiline regex
 config_regex = \
@@ -47,6 +76,180 @@ config_regex = \
     b"(?P<regex>(^[^#].*\n)+)"
 
 
+def regex_literals(items):
+    """
+    Yields the literal bytes a parsed regex matches in sequence, and
+    None wherever something else (a class, a repeat, an alternation...)
+    breaks the sequence
+    """
+    for op, av in items:
+        if op == sre_parse.LITERAL:
+            yield av
+        elif op == sre_parse.SUBPATTERN and not av[1] & re.IGNORECASE:
+            # a group matches its contents in sequence
+            yield from regex_literals(av[3])
+        else:
+            yield None
+
+
+def regex_anchor(regex):
+    """
+    Returns the longest run of literal bytes every match of the regex
+    contains, or None if there is none: the regex cannot match a file
+    the anchor is not found in
+    """
+    try:
+        parsed = sre_parse.parse(regex, re.MULTILINE)
+    except re.error:
+        return None
+    if parsed.state.flags & re.IGNORECASE:
+        return None
+
+    anchor = run = b""
+    for literal in regex_literals(parsed):
+        if literal is None:
+            run = b""
+            continue
+        run += bytes([literal])
+        if len(run) > len(anchor):
+            anchor = run
+    return anchor or None
+
+
+def regex_class_newline(items):
+    """
+    Tells if a parsed character class can match a newline
+    """
+    negate = False
+    newline = False
+    for op, av in items:
+        if op == sre_parse.NEGATE:
+            negate = True
+        elif op == sre_parse.LITERAL:
+            newline |= av == ord("\n")
+        elif op == sre_parse.RANGE:
+            newline |= av[0] <= ord("\n") <= av[1]
+        elif op == sre_parse.CATEGORY:
+            newline |= av not in (sre_parse.CATEGORY_DIGIT,
+                                  sre_parse.CATEGORY_NOT_SPACE,
+                                  sre_parse.CATEGORY_WORD,
+                                  sre_parse.CATEGORY_NOT_LINEBREAK)
+        else:
+            return True		# don't know, assume it can
+    return newline != negate
+
+
+def regex_newlines(items, dotall, groups):
+    """
+    Returns the most newlines a match of a parsed regex can span, or
+    read ahead with a lookahead; None if there is no bound. groups maps
+    the groups found so far to theirs, for the backreferences
+    """
+    total = 0
+    for op, av in items:
+        if op == sre_parse.LITERAL:
+            n = int(av == ord("\n"))
+        elif op == sre_parse.NOT_LITERAL:
+            n = int(av != ord("\n"))
+        elif op == sre_parse.ANY:
+            n = int(dotall)
+        elif op == sre_parse.IN:
+            n = int(regex_class_newline(av))
+        elif op == sre_parse.AT:
+            n = 0
+        elif op == sre_parse.BRANCH:
+            ns = [regex_newlines(branch, dotall, groups) for branch in av[1]]
+            n = None if None in ns else max(ns)
+        elif op == sre_parse.SUBPATTERN:
+            group, add_flags, del_flags, p = av
+            if add_flags & re.DOTALL:
+                dotall = True
+            elif del_flags & re.DOTALL:
+                dotall = False
+            n = regex_newlines(p, dotall, groups)
+            if group is not None:
+                groups[group] = n
+        elif op in (sre_parse.MAX_REPEAT, sre_parse.MIN_REPEAT,
+                    getattr(sre_parse, "POSSESSIVE_REPEAT", None)):
+            _min, _max, p = av
+            n = regex_newlines(p, dotall, groups)
+            if n and _max == sre_parse.MAXREPEAT:
+                n = None
+            elif n:
+                n *= _max
+        elif op == getattr(sre_parse, "ATOMIC_GROUP", None):
+            n = regex_newlines(av, dotall, groups)
+        elif op == sre_parse.GROUPREF:
+            n = groups.get(av)
+        elif op == sre_parse.GROUPREF_EXISTS:
+            _group, yes, no = av
+            ns = [regex_newlines(yes, dotall, groups),
+                  regex_newlines(no or [], dotall, groups)]
+            n = None if None in ns else max(ns)
+        elif op in (sre_parse.ASSERT, sre_parse.ASSERT_NOT):
+            direction, p = av
+            # a lookbehind only reads what was already matched
+            n = regex_newlines(p, dotall, groups) if direction > 0 else 0
+        else:
+            n = None			# don't know, assume no bound
+        if n is None:
+            return None
+        total += n
+    return total
+
+
+def regex_lines(regex):
+    """
+    Returns the most newlines a match of the regex can span, None if
+    there is no bound (e.g. (.*\n)+)
+    """
+    try:
+        parsed = sre_parse.parse(regex, re.MULTILINE)
+    except re.error:
+        return None
+    return regex_newlines(parsed, parsed.state.flags & re.DOTALL, {})
+
+
+def anchors_compile(anchors):
+    """
+    Compiles the alternation of the anchors, longest first, to find all
+    of them in one pass over a file
+    """
+    anchors = sorted(set(anchors), key=len, reverse=True)
+    if not anchors:
+        return None
+    return re.compile(b"|".join(re.escape(anchor) for anchor in anchors))
+
+
+def anchors_overlap(first, second):
+    """
+    Tells if the end of the first anchor can be the start of the second
+    """
+    return any(first.endswith(second[:i]) for i in range(1, len(second)))
+
+
+def anchors_find(anchor_regex, anchors, data):
+    """
+    Returns the set of the anchors found in the data.
+
+    The matches of the alternation do not overlap, so an anchor is also
+    in the data if it is part of an anchor matched; if it can overlap the
+    end of an anchor matched, it may have been hidden by it and is
+    searched for alone.
+    """
+    if anchor_regex is None:
+        return set()
+    found = set(m.group(0) for m in anchor_regex.finditer(data))
+    present = set()
+    for anchor in anchors:
+        if any(anchor in f for f in found):
+            present.add(anchor)
+        elif any(anchors_overlap(f, anchor) for f in found) \
+                and data.find(anchor) != -1:
+            present.add(anchor)
+    return present
+
+
 def config_import_file(filename):
     """
     Imports regular expresions from any file *.conf in the given path,
@@ -65,18 +268,16 @@ def config_import_file(filename):
                 gd = m.groupdict()
                 comment = gd['comment']
                 regex = gd['regex']
-                try:
-                    r = re.compile(regex, re.MULTILINE)
-                except sre_constants.error as e:
-                    logging.error("%s: bytes %d-%d: bad regex: %s",
-                                  filename, m.start(), m.end(), e)
-                    raise
-                logging.debug("%s: found regex at bytes %d-%d: %s",
-                              filename, m.start(), m.end(), regex)
+                anchor = regex_anchor(regex)
+                logging.debug("%s: found regex at bytes %d-%d: %s "
+                              "(anchor %s)",
+                              filename, m.start(), m.end(), regex, anchor)
                 if b'#WARNING' in comment:
-                    exclude_regexs.append((r, origin, ('warning',)))
+                    flags = ('warning',)
                 else:
-                    exclude_regexs.append((r, origin, ()))
+                    flags = ()
+                config_entries.append((regex, comment, origin, flags,
+                                       anchor))
             logging.debug("%s: loaded", filename)
     except Exception as e:
         logging.error("E: %s: can't load config file: %s" % (filename, e))
@@ -89,12 +290,18 @@ def config_import_path(path):
     """
     file_regex = re.compile(".*\.conf$")
     try:
+        if not os.path.isdir(path):
+            # nothing to walk, the cache is stale once it is created
+            config_stamps.append((path, path_mtime(path)))
         for dirpath, dirnames, filenames in os.walk(path):
+            # a file added or removed changes the mtime of its directory
+            config_stamps.append((dirpath, path_mtime(dirpath)))
             for _filename in sorted(filenames):
                 filename = os.path.join(dirpath, _filename)
                 if not file_regex.search(_filename):
                     logging.debug("%s: ignored", filename)
                     continue
+                config_stamps.append((filename, path_mtime(filename)))
                 config_import_file(filename)
     except Exception as e:
         raise Exception(
@@ -102,9 +309,9 @@ def config_import_path(path):
             (path, e, traceback.format_exc()))
 
 
-def config_import(paths):
+def config_paths(paths):
     """
-    Imports regular expresions from any file *.conf in the list of paths.
+    Returns the list of paths to import the configuration from.
 
     If a path is "" or None, the list of paths until then is flushed
     and only the new ones are considered.
@@ -118,102 +325,165 @@ def config_import(paths):
         else:
             _paths.append(path)
     logging.debug("config list: %s", _paths)
-    for path in _paths:
-        config_import_path(path)
-
-
-arg_parser = argparse.ArgumentParser(
-    description=__doc__,
-    formatter_class=argparse.RawDescriptionHelpFormatter)
-arg_parser.add_argument("-v", "--verbosity", action="count", default=0,
-                        help="increase verbosity")
-arg_parser.add_argument("-q", "--quiet", action="count", default=0,
-                        help="decrease verbosity")
-arg_parser.add_argument("-e", "--errors", action="store", default=None,
-                        help="file where to store errors")
-arg_parser.add_argument("-w", "--warnings", action="store", default=None,
-                        help="file where to store warnings")
-arg_parser.add_argument("-c", "--config-dir", action="append", nargs="?",
-                        default=[".known-issues/"],
-                        help="configuration directory (multiple can be "
-                        "given; if none given, clears the current list) "
-                        "%(default)s")
-arg_parser.add_argument("FILENAMEs", nargs="+",
-                        help="files to filter")
-args = arg_parser.parse_args()
-
-logging.basicConfig(level=40 - 10 * (args.verbosity - args.quiet),
-                    format="%(levelname)s: %(message)s")
-
-path = ".known-issues/"
-logging.debug("Reading configuration from directory `%s`", path)
-config_import(args.config_dir)
-
-exclude_ranges = []
+    return _paths
 
-if args.warnings:
-    warnings = open(args.warnings, "w")
-else:
-    warnings = None
-if args.errors:
-    errors = open(args.errors, "w")
-else:
-    errors = None
-
-
-def report_error(data):
-    sys.stdout.write(data)
-    if errors:
-        errors.write(data)
 
+def config_import(paths):
+    """
+    Imports regular expresions from any file *.conf in the list of paths
+    (as returned by config_paths())
+    """
+    for path in paths:
+        config_import_path(path)
 
-def report_warning(data):
-    sys.stderr.write(data)
-    if warnings:
-        warnings.write(data)
 
+def path_mtime(path):
+    """
+    Returns the modification time of a path in ns, None if it is missing
+    """
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
 
-if args.warnings:
-    warnings = open(args.warnings, "w")
-else:
-    warnings = None
-if args.errors:
-    errors = open(args.errors, "w")
-else:
-    errors = None
 
+def cache_load(filename, paths):
+    """
+    Returns the configuration entries saved in the cache file for the
+    list of paths, None if there is none or any of the files or
+    directories they were read from changed since
+    """
+    try:
+        with open(filename, "rb") as f:
+            version, _paths, stamps, entries = pickle.load(f)
+    except FileNotFoundError:
+        logging.info("%s: no pattern cache", filename)
+        return None
+    except Exception as e:
+        logging.warning("%s: ignoring bad pattern cache: %s", filename, e)
+        return None
+    if version != CACHE_VERSION or _paths != paths:
+        logging.info("%s: pattern cache of other config paths %s",
+                     filename, _paths)
+        return None
+    for path, mtime in stamps:
+        if path_mtime(path) != mtime:
+            logging.info("%s: pattern cache is stale: %s changed",
+                         filename, path)
+            return None
+    return entries
+
+
+def cache_save(filename, paths):
+    """
+    Saves the configuration entries and the mtimes of the files and
+    directories they were read from in the cache file; the cache is
+    only an optimization, failing to write it is not an error
+    """
+    tmpname = "%s.%d" % (filename, os.getpid())
+    try:
+        with open(tmpname, "wb") as f:
+            pickle.dump((CACHE_VERSION, paths, config_stamps,
+                         config_entries), f, pickle.HIGHEST_PROTOCOL)
+        os.replace(tmpname, filename)
+    except OSError as e:
+        logging.warning("%s: can't save pattern cache: %s", filename, e)
+        try:
+            os.unlink(tmpname)
+        except OSError:
+            pass
+
+
+def config_compile(entries):
+    """
+    Compiles the regular expresions of the configuration entries
+    """
+    for regex, _comment, origin, flags, anchor in entries:
+        try:
+            r = re.compile(regex, re.MULTILINE)
+        except re.error as e:
+            logging.error("%s: bad regex: %s", origin, e)
+            raise
+        exclude_regexs.append((r, origin, flags, anchor))
 
-def report_error(data):
-    sys.stdout.write(data.decode('utf-8'))
-    if errors:
-        errors.write(data)
 
+def config_load(config_dirs, cache):
+    """
+    Loads the regular expresions from the configuration directories, or
+    from the cache file if given and still valid, and compiles them
+    """
+    paths = config_paths(config_dirs)
+    start = time.perf_counter()
+    entries = None
+    if cache:
+        entries = cache_load(cache, paths)
+    source = cache
+    if entries is None:
+        config_import(paths)
+        entries = config_entries
+        source = "config files"
+    loaded = time.perf_counter()
+    config_compile(entries)
+    logging.warning("%d regexs read from %s in %.3fs, compiled in %.3fs",
+                    len(entries), source, loaded - start,
+                    time.perf_counter() - loaded)
+    if cache and entries is config_entries:
+        cache_save(cache, paths)
+
+
+def filter_init(config_dirs, cache, level):
+    """
+    Initializes a filtering process; the known issues are loaded and
+    compiled once per process, not once per file (a forked worker
+    inherits them)
+    """
+    global anchors, anchor_regex
 
-def report_warning(data):
-    sys.stderr.write(data)
-    if warnings:
-        warnings.write(data)
+    logging.basicConfig(level=level, format="%(levelname)s: %(message)s")
+    if not exclude_regexs:
+        config_load(config_dirs, cache)
+    # the regexs with an anchor are only run on the files it is found in
+    anchors = [anchor for _r, _origin, _flags, anchor in exclude_regexs
+               if anchor is not None]
+    anchor_regex = anchors_compile(anchors)
 
 
-for filename in args.FILENAMEs:
+def filter_file(filename):
+    """
+    Filters a file, returning the list of (warning, data) to report in
+    file order: data is a warning if warning is True, an error otherwise;
+    and the statistics of the regexs, as stats_new()
+    """
+    reports = []
+    stats = stats_new()
     if os.stat(filename).st_size == 0:
-        continue  # skip empty log files
+        return reports, stats  # skip empty log files
+    exclude_ranges = []
     try:
-        with open(filename, "r+b") as f:
+        with open(filename, "rb") as f:
             logging.info("%s: filtering", filename)
             # Yeah, this should be more protected in case of exception
             # and such, but this is a short running program...
-            mm = mmap.mmap(f.fileno(), 0)
-            for ex, origin, flags in exclude_regexs:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            found = anchors_find(anchor_regex, anchors, mm)
+            for i, (ex, origin, flags, anchor) in enumerate(exclude_regexs):
+                if anchor is not None and anchor not in found:
+                    logging.info("%s: skipping %s: %r not found",
+                                 filename, origin, anchor)
+                    continue
                 logging.info("%s: searching from %s: %s",
                              filename, origin, ex.pattern)
-                for m in re.finditer(ex.pattern, mm, re.MULTILINE):
+                start = time.perf_counter()
+                for m in ex.finditer(mm):
                     logging.info("%s: %s-%s: match from from %s %s",
                                  filename, m.start(), m.end(), origin, flags)
+                    stats[i][0] += 1
+                    stats[i][1] += m.end() - m.start()
                     if 'warning' in flags:
                         exclude_ranges.append((m.start(), m.end(), True))
                     else:
                         exclude_ranges.append((m.start(), m.end(), False))
+                stats[i][2] += time.perf_counter() - start
 
             exclude_ranges = sorted(exclude_ranges, key=lambda r: r[0])
             logging.warning(
@@ -231,13 +501,13 @@ for filename in args.FILENAMEs:
                     # We have something not caught by a filter, an error
                     logging.info("%s: error range (%d, %d), from %d %dB",
                                  filename, offset, b, offset, b - offset)
-                    report_error(mm.read(b - offset))
+                    reports.append((False, mm.read(b - offset)))
                     mm.seek(b)
                 if warning == True:		# A warning, print it
                     mm.seek(b)
                     logging.info("%s: warning range (%d, %d), from %d %dB",
                                  filename, b, e, offset, e - b)
-                    report_warning(mm.read(e - b))
+                    reports.append((True, mm.read(e - b)))
                 else:				# Exclude, ignore it
                     d = b - offset
                     logging.info("%s: exclude range (%d, %d), from %d %dB",
@@ -247,8 +517,260 @@ for filename in args.FILENAMEs:
             if len(mm) != offset:
                 logging.info("%s: error final range from %d %dB",
                              filename, offset, len(mm))
-                report_error(mm.read(len(mm) - offset - 1))
+                reports.append((False, mm.read(len(mm) - offset - 1)))
             del mm
     except Exception as e:
         logging.error("%s: cannot load: %s", filename, e)
         raise
+    return reports, stats
+
+
+def stats_new():
+    """
+    Returns the statistics of the regexs for a new file: a list of
+    [matches, bytes matched, seconds searching] per regex, in the order
+    of exclude_regexs
+    """
+    return [[0, 0, 0.0] for _ in exclude_regexs]
+
+
+def stats_add(total, stats):
+    """
+    Adds the statistics of the regexs on a file to the total
+    """
+    for t, s in zip(total, stats):
+        t[0] += s[0]
+        t[1] += s[1]
+        t[2] += s[2]
+
+
+def stats_report(filename, stats):
+    """
+    Writes the matches, bytes matched and time searching of each regex
+    to the file, slowest first; the regexs that matched nothing are
+    flagged as unused
+    """
+    unused = 0
+    with open(filename, "w") as f:
+        f.write("%10s %10s %12s  %s\n" % ("seconds", "matches", "bytes",
+                                           "origin"))
+        for (matches, size, seconds), (_r, origin, _flags, _anchor) in \
+                sorted(zip(stats, exclude_regexs),
+                       key=lambda s: s[0][2], reverse=True):
+            if matches == 0:
+                unused += 1
+            f.write("%10.6f %10d %12d  %s%s\n" % (
+                seconds, matches, size, origin,
+                "  UNUSED" if matches == 0 else ""))
+    logging.warning("%s: statistics of %d regexs, %d unused",
+                    filename, len(stats), unused)
+
+
+def stream_window():
+    """
+    Returns the most newlines a match of any regex can span, None if
+    one of them has no bound
+    """
+    window = 0
+    for ex, origin, _flags, _anchor in exclude_regexs:
+        lines = regex_lines(ex.pattern)
+        if lines is None:
+            logging.warning("%s: no bound on the lines a match spans, "
+                            "the stream is read whole before filtering",
+                            origin)
+            return None
+        window = max(window, lines)
+    return window
+
+
+def filter_stream(f):
+    """
+    Filters a stream (stdin, a pipe...) as the data arrives, yielding
+    the lists of (warning, data) to report, in order, and the statistics
+    of the regexs on the data filtered since, as filter_file().
+
+    The data is kept in a window of whole lines; a match is only taken
+    once the window holds all the lines it can span, so the ranges are
+    those found in the whole data, and the lines before the earliest
+    one a match can still start in, or be reported from, are dropped.
+    """
+    window = stream_window()
+    logging.info("<stdin>: filtering, window of %s lines", window)
+    data = bytearray()	# the window, starting at offset base
+    base = 0
+    settled = 0		# all the matches starting before are found
+    offset = 0		# what is before is reported or excluded
+    last_end = [0] * len(exclude_regexs)
+    ranges_excluded = 0
+    eof = False
+    while not eof:
+        chunk = f.read1(STREAM_READ)
+        eof = not chunk
+        data += chunk
+        if eof:
+            settle = base + len(data)
+        elif window is None:
+            continue
+        else:
+            # skip back the lines a match starting before can span
+            pos = data.rfind(b"\n") + 1
+            for _ in range(window):
+                if pos == 0:
+                    break
+                pos = data.rfind(b"\n", 0, pos - 1) + 1
+            settle = max(base + pos, settled)
+
+        exclude_ranges = []
+        stats = stats_new()
+        found = anchors_find(anchor_regex, anchors, data)
+        for i, (ex, origin, flags, anchor) in enumerate(exclude_regexs):
+            if anchor is not None and anchor not in found:
+                continue
+            start = time.perf_counter()
+            for m in ex.finditer(data, max(last_end[i], settled) - base):
+                b, e = base + m.start(), base + m.end()
+                if b >= settle:
+                    break		# may be another match with more data
+                if b == e:
+                    continue		# excludes nothing
+                logging.info("<stdin>: %s-%s: match from from %s %s",
+                             b, e, origin, flags)
+                stats[i][0] += 1
+                stats[i][1] += e - b
+                last_end[i] = e
+                exclude_ranges.append((b, e, 'warning' in flags))
+            stats[i][2] += time.perf_counter() - start
+        settled = settle
+
+        exclude_ranges = sorted(exclude_ranges, key=lambda r: r[0])
+        logging.info("<stdin>: ranges excluded: %s", exclude_ranges)
+        ranges_excluded += len(exclude_ranges)
+
+        # Same as filter_file(); the error data up to where the
+        # matches are all found can also be reported now, but the last
+        # byte of the data is not reported
+        reports = []
+        for b, e, warning in exclude_ranges:
+            if b > offset:
+                reports.append((False, data[offset - base:b - base]))
+            if warning == True:
+                reports.append((True, data[b - base:e - base]))
+            offset = e
+        if eof:
+            if base + len(data) != offset:
+                reports.append((False, data[offset - base:len(data) - 1]))
+        elif settled - 1 > offset:
+            reports.append((False, data[offset - base:settled - 1 - base]))
+            offset = settled - 1
+        yield reports, stats
+
+        cut = data.rfind(b"\n", 0, min(offset, settled) - base) + 1
+        del data[:cut]
+        base += cut
+
+    logging.warning("<stdin>: %d ranges excluded", ranges_excluded)
+
+
+arg_parser = argparse.ArgumentParser(
+    description=__doc__,
+    formatter_class=argparse.RawDescriptionHelpFormatter)
+arg_parser.add_argument("-v", "--verbosity", action="count", default=0,
+                        help="increase verbosity")
+arg_parser.add_argument("-q", "--quiet", action="count", default=0,
+                        help="decrease verbosity")
+arg_parser.add_argument("-e", "--errors", action="store", default=None,
+                        help="file where to store errors")
+arg_parser.add_argument("-w", "--warnings", action="store", default=None,
+                        help="file where to store warnings")
+arg_parser.add_argument("-c", "--config-dir", action="append", nargs="?",
+                        default=[".known-issues/"],
+                        help="configuration directory (multiple can be "
+                        "given; if none given, clears the current list) "
+                        "%(default)s")
+arg_parser.add_argument("--cache", action="store", default=None,
+                        help="file where to cache the known issues read "
+                        "from the configuration directories; it is used "
+                        "as long as none of their files changes")
+arg_parser.add_argument("--stats", action="store", default=None,
+                        help="file where to write the matches, bytes "
+                        "matched and time spent of each regex, flagging "
+                        "the ones that matched nothing")
+arg_parser.add_argument("-j", "--jobs", action="store", type=int,
+                        default=os.cpu_count(),
+                        help="number of files filtered in parallel "
+                        "%(default)s")
+arg_parser.add_argument("FILENAMEs", nargs="+",
+                        help="files to filter, - for stdin")
+
+
+def main():
+    args = arg_parser.parse_args()
+    level = 40 - 10 * (args.verbosity - args.quiet)
+
+    path = ".known-issues/"
+    logging.basicConfig(level=level, format="%(levelname)s: %(message)s")
+    logging.debug("Reading configuration from directory `%s`", path)
+    # load the configuration here first, so a bad regex is reported once
+    filter_init(args.config_dir, args.cache, level)
+
+    if args.warnings:
+        warnings = open(args.warnings, "w")
+    else:
+        warnings = None
+    if args.errors:
+        errors = open(args.errors, "w")
+    else:
+        errors = None
+
+    def report_error(data):
+        sys.stdout.write(data.decode('utf-8'))
+        if errors:
+            errors.write(data.decode('utf-8'))
+
+    def report_warning(data):
+        sys.stderr.write(data.decode('utf-8'))
+        if warnings:
+            warnings.write(data.decode('utf-8'))
+
+    stats = stats_new()
+
+    def report(reports):
+        for warning, data in reports:
+            if warning:
+                report_warning(data)
+            else:
+                report_error(data)
+
+    def report_files(results):
+        # the files are reported in the order they were given, whatever
+        # the order the workers finish them in
+        for filename in args.FILENAMEs:
+            if filename != "-":
+                reports, file_stats = next(results)
+                report(reports)
+                stats_add(stats, file_stats)
+                continue
+            # stdin is filtered here as it arrives, the workers go on
+            # with the next files meanwhile
+            for reports, stream_stats in filter_stream(sys.stdin.buffer):
+                report(reports)
+                stats_add(stats, stream_stats)
+                for f in (sys.stdout, sys.stderr, errors, warnings):
+                    if f:
+                        f.flush()
+
+    files = [filename for filename in args.FILENAMEs if filename != "-"]
+    jobs = min(args.jobs, len(files))
+    if jobs > 1:
+        with multiprocessing.Pool(jobs, filter_init,
+                                  (args.config_dir, args.cache,
+                                   level)) as pool:
+            report_files(pool.imap(filter_file, files))
+    else:
+        report_files(map(filter_file, files))
+    if args.stats:
+        stats_report(args.stats, stats)
+
+
+if __name__ == "__main__":
+    main()
@@ -20,7 +20,7 @@
 
 /* for opt */
 static uint64_t period = 10000;
-static const char optString[] = "t:hc";
+static const char optString[] = "t:hcr";
 static const char dev_name[] = "/dev/acrn_trace";
 
 static uint32_t flags;
@@ -32,11 +32,12 @@ static int pcpu_num = 0;
 static void display_usage(void)
 {
 	printf("acrntrace - tool to collect ACRN trace data\n"
-	       "[Usage] acrntrace [-t] [period in msec] [-ch]\n\n"
+	       "[Usage] acrntrace [-t] [period in msec] [-chr]\n\n"
 	       "[Options]\n"
 	       "\t-h: print this message\n"
 	       "\t-t: period_in_ms: specify polling interval [1-999]\n"
-	       "\t-c: clear the buffered old data\n");
+	       "\t-c: clear the buffered old data\n"
+	       "\t-r: dump the raw binary trace records instead of text\n");
 }
 
 static int parse_opt(int argc, char *argv[])
@@ -57,6 +58,9 @@ static int parse_opt(int argc, char *argv[])
 		case 'c':
 			flags |= FLAG_CLEAR_BUF;
 			break;
+		case 'r':
+			flags |= FLAG_RAW_TRACE;
+			break;
 		case 'h':
 			display_usage();
 			return -EINVAL;
@@ -180,6 +184,7 @@ static void reader_fn(param_t * param)
 	FILE *fp = param->trace_filep;
 	shared_buf_t *sbuf = param->sbuf;
 	trace_ev_t e;
+	trace_raw_hdr_t hdr;
 
 	pr_dbg("reader thread[%lu] created for FILE*[0x%p]\n",
 	       pthread_self(), fp);
@@ -191,8 +196,17 @@ static void reader_fn(param_t * param)
 	if (flags & FLAG_CLEAR_BUF)
 		sbuf_clear_buffered(sbuf);
 
-	/* write cpu freq to the first line of output file */
-	fprintf(fp, "CPU Freq: %f\n", get_cpu_freq());
+	if (flags & FLAG_RAW_TRACE) {
+		/* raw output file starts with a header of one record size */
+		memset(&hdr, 0, sizeof(hdr));
+		hdr.magic = TRACE_RAW_MAGIC;
+		hdr.cpuid = cpuid;
+		hdr.freq = get_cpu_freq();
+		fwrite(&hdr, sizeof(hdr), 1, fp);
+	} else {
+		/* write cpu freq to the first line of output file */
+		fprintf(fp, "CPU Freq: %f\n", get_cpu_freq());
+	}
 
 	while (1) {
 		do {
@@ -204,6 +218,11 @@ static void reader_fn(param_t * param)
 				return;
 			}
 
+			if (flags & FLAG_RAW_TRACE) {
+				fwrite(&e, sizeof(e), 1, fp);
+				continue;
+			}
+
 			fprintf(fp, "%u | %lu | ", cpuid, e.tsc);
 			switch (e.id) {
 				/* defined in trace_event.h     */
@@ -38,9 +38,11 @@
  * flags:
  * FLAG_TO_REL   - resources need to be release
  * FLAG_CLEAR_BUF - to clear buffered old data
+ * FLAG_RAW_TRACE - to dump raw trace_ev_t records instead of text
  */
 #define FLAG_TO_REL		(1UL << 0)
 #define FLAG_CLEAR_BUF		(1UL << 1)
+#define FLAG_RAW_TRACE		(1UL << 2)
 
 #define foreach_cpu(cpu)                                       \
         for ((cpu) = 0; (cpu) < (pcpu_num); (cpu)++)
@@ -70,6 +72,20 @@ typedef struct {
 	};
 } trace_ev_t;
 
+/* "ACRNTRAW", magic of the raw trace data file */
+#define TRACE_RAW_MAGIC		0x574152544e524341UL
+
+/*
+ * header of the raw trace data file, followed by the trace_ev_t records,
+ * make sure sizeof(trace_raw_hdr_t) == TRACE_ELEMENT_SIZE
+ */
+typedef struct {
+	uint64_t magic;
+	uint64_t cpuid;
+	double freq;
+	uint64_t reserved;
+} trace_raw_hdr_t;
+
 typedef struct {
 	uint32_t cpuid;
 	int exit_flag;
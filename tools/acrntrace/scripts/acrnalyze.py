@@ -4,14 +4,26 @@
 """
 This is the main script of arnalyzer, which:
 - parse the options
-- pre-process the trace data file
 - call a specific script to do analysis
 """
 
 import sys
 import getopt
-import os
-from vmexit_analyze import analyze_vm_exit
+from vmexit_analyze import analyze_vm_exit, analyze_vm_exit_dir
+from trace_follow import follow_vm_exit
+from trace_merge import export_chrome_trace
+from diff_analyze import analyze_diff
+from hotspot_analyze import analyze_hotspot, analyze_hotspot_dir
+from trace_analyze import analyze_trace, analyze_trace_dir
+from analyzer import ANALYZERS
+from trace_cache import set_cache_dir, CACHE_SIZE_MB
+from trace_input import set_extract_archives
+
+# analyzers with their own entry points, used when they run alone
+ANALYZE_FUNCS = {
+    'vm_exit': (analyze_vm_exit, analyze_vm_exit_dir),
+    'hotspot': (analyze_hotspot, analyze_hotspot_dir)
+}
 
 def usage():
     """print the usage of the script
@@ -21,43 +33,86 @@ def usage():
     """
     print '''
     [Usage] acrnalyze.py [options] [value] ...
+            acrnalyze.py --diff [options] trace_a trace_b
 
     [options]
     -h: print this message
-    -i, --ifile=[string]: input file
+    -i, --ifile=[string]: input file, text trace data may be compressed
+                          (.gz, .xz, .zst)
+    -d, --dir=[string]: input trace data directory, one file per cpu,
+                        the files are analyzed in parallel, or tarball of
+                        the directory, maybe compressed, read once as a
+                        stream, its files one after the other
+    --extract: extract the tarball given to -d or --diff, or holding the -i
+               file, to a temporary directory first, to analyze its files
+               in parallel, or the -i file in chunks, the tarball of
+               --chrome is always extracted
     -o, --ofile=[string]: output file
+    -j, --jobs=[int]: number of worker processes, 0 for one per host cpu,
+                      the input file is parsed in chunks when more than 1
+    --vector: load raw trace data (acrntrace -r) into NumPy arrays and do
+              a vectorized analysis, always done if NumPy is available;
+              text trace data is always parsed line by line
+    --cache=[string]: cache directory, the first analysis of a text trace
+                      data file saves it there as raw trace data, which
+                      the next analyses read instead of parsing the text,
+                      whatever the analyzers, --diff or --chrome
+    --cache_size=[int]: size the cache directory is trimmed to, in MiB,
+                        the least recently used traces are removed first
+    --follow: analyze the input file or directory while acrntrace is still
+              writing it, text or raw, refresh the exit rates until ctrl-c
+    --chrome: export the events of the input file or of all the cpus of
+              the input directory, in TSC order, to ofile.trace.json, in
+              the Chrome trace event format (chrome://tracing, Perfetto)
+    --diff: compare the vm exits of two trace data files or directories,
+            e.g. before and after a change, given after the options:
+            per-reason exit rate and time percentage deltas, flagged as
+            significant from the rates per --timeline window (default
+            100 ms), latency
+            percentile shifts and new or vanished vectors, saved to
+            ofile_diff.csv
+    --interval=[int]: seconds between two refreshes in follow mode
+    --window=[int]: seconds of trace the follow mode rates are computed over
+    --top=[int]: number of hotspots reported per guest RIP, GPA page,
+                 I/O port and MSR
+    --timeline=[int]: bucket size in milliseconds of the vm_exit timeline,
+                      the exits and cycles in exit per bucket and reason
+                      are saved to ofile_timeline.csv
+    --overhead=[float]: exit overhead, in percent of a --timeline bucket,
+                        beyond which the guest_run report lists the bucket
+                        (default 20)
     --vm_exit: to generate vm_exit report
+    --hotspot: to generate exit hotspot report
+    --timer: to generate timer report, timers added and picked up per
+             --timeline bucket (default 10 ms), deadline slip and timer
+             IRQ rate
+    --irq: to generate interrupt report, per exception, interrupt and
+           virtual EOI vector, and rates per --timeline bucket
+    --profile: to generate function profile report from the ENTER/EXIT
+               events, and collapsed stacks to ofile_profile.folded
+    --guest_run: to generate guest run report, distribution of the time
+                 from a VM_ENTER to the next exit, run percentage, longest
+                 run, and the --timeline buckets (default 10 ms) the exits
+                 took more than --overhead of
+
+    Several analyzers can be given, their reports are then generated from
+    a single read of the trace data.
     '''
 
-def do_analysis(ifile, ofile, analyzer):
+def do_analysis(ifile, ofile, analyzer, **options):
     """do the specific analysis
 
     Args:
         ifile: input trace data file
         ofile: output analysis report file
         analyzer: a function do the specific analysis
+        options: analysis options, e.g. jobs, number of worker processes
     Returns:
         None
     Raises:
         NA
     """
-    analyzer(ifile, ofile)
-
-# pre process to make sure the trace data start and end with VMENTER
-def pre_process(ifile, evstr):
-    """invoke sh script to preprocess the data file
-
-    Args:
-        ifile: input trace data file
-        evstr: event string, after the processing, the data file should
-                start and end with the string
-    Returns:
-        status of sh script execution
-    Raises:
-        NA
-    """
-    status = os.system('bash pre_process.sh %s %s' % (ifile, evstr))
-    return status
+    analyzer(ifile, ofile, **options)
 
 def main(argv):
     """Main enterance function
@@ -70,12 +125,28 @@ def main(argv):
         GetoptError
     """
     inputfile = ''
+    inputdir = ''
     outputfile = ''
-    opts_short = "hi:o:"
-    opts_long = ["ifile=", "ofile=", "vm_exit"]
+    analyzers = []
+    jobs = None
+    vector = False
+    follow = False
+    chrome = False
+    diff = False
+    extract = False
+    cache_dir = None
+    cache_size = CACHE_SIZE_MB
+    follow_opts = {}
+    options = {}
+    opts_short = "hi:d:o:j:"
+    opts_long = ["ifile=", "dir=", "ofile=", "jobs=", "vector", "follow",
+                 "chrome", "diff", "extract", "cache=", "cache_size=", "interval=",
+                 "window=", "top=", "timeline=", "overhead="] + \
+                sorted(ANALYZERS.keys())
 
     try:
-        opts, args = getopt.getopt(argv, opts_short, opts_long)
+        # the traces to compare may come before the options
+        opts, args = getopt.gnu_getopt(argv, opts_short, opts_long)
     except getopt.GetoptError:
         usage()
         sys.exit(1)
@@ -86,22 +157,89 @@ def main(argv):
             sys.exit()
         elif opt in ("-i", "--ifile"):
             inputfile = arg
+        elif opt in ("-d", "--dir"):
+            inputdir = arg
         elif opt in ("-o", "--ofile"):
             outputfile = arg
-        elif opt == "--vm_exit":
-            analyzer = analyze_vm_exit
+        elif opt in ("-j", "--jobs"):
+            jobs = int(arg)
+        elif opt == "--vector":
+            vector = True
+        elif opt == "--follow":
+            follow = True
+        elif opt == "--chrome":
+            chrome = True
+        elif opt == "--diff":
+            diff = True
+        elif opt == "--extract":
+            extract = True
+        elif opt == "--cache":
+            cache_dir = arg
+        elif opt == "--cache_size":
+            cache_size = int(arg)
+        elif opt == "--interval":
+            follow_opts['interval'] = int(arg)
+        elif opt == "--window":
+            follow_opts['window'] = int(arg)
+        elif opt == "--top":
+            options['top'] = int(arg)
+        elif opt == "--timeline":
+            options['timeline'] = int(arg)
+        elif opt == "--overhead":
+            options['overhead'] = float(arg)
+        elif opt[2:] in ANALYZERS:
+            if opt[2:] not in analyzers:
+                analyzers.append(opt[2:])
         else:
             assert False, "unhandled option"
 
-    assert inputfile != '', "input file is required"
     assert outputfile != '', "output file is required"
-    assert analyzer != '', 'MUST contain one of analyzer: ''vm_exit'
 
-    status = pre_process(inputfile, 'VM_ENTER')
-    if status == 0:
-        do_analysis(inputfile, outputfile, analyzer)
+    # the chrome export reads all the files of a tarball together
+    set_extract_archives(extract or chrome)
+
+    if diff:
+        assert len(args) == 2, "two trace data files or directories to compare"
+        if cache_dir is not None:
+            set_cache_dir(cache_dir, cache_size)
+        analyze_diff(args[0], args[1], outputfile,
+                     jobs=0 if jobs is None else jobs, vector=vector,
+                     **options)
+        return
+
+    assert inputfile != '' or inputdir != '', \
+            "input file or directory is required"
+    assert len(analyzers) != 0 or chrome, \
+            'MUST contain one of analyzer: ' + ', '.join(sorted(ANALYZERS))
+
+    # trace data being written by acrntrace is not cached
+    if cache_dir is not None and not follow:
+        set_cache_dir(cache_dir, cache_size)
+
+    if follow:
+        do_analysis(inputdir if inputdir != '' else inputfile, outputfile,
+                    follow_vm_exit, **follow_opts)
+    elif chrome:
+        do_analysis(inputdir if inputdir != '' else inputfile, outputfile,
+                    export_chrome_trace)
+    elif len(analyzers) > 1 or analyzers[0] not in ANALYZE_FUNCS:
+        if inputdir != '':
+            do_analysis(inputdir, outputfile, analyze_trace_dir,
+                        names=analyzers, jobs=0 if jobs is None else jobs,
+                        **options)
+        else:
+            do_analysis(inputfile, outputfile, analyze_trace,
+                        names=analyzers, **options)
+    elif inputdir != '':
+        (analyzer, dir_analyzer) = ANALYZE_FUNCS[analyzers[0]]
+        do_analysis(inputdir, outputfile, dir_analyzer,
+                    jobs=0 if jobs is None else jobs, vector=vector,
+                    **options)
     else:
-        print "Invalid trace data file %s" % (inputfile)
+        (analyzer, dir_analyzer) = ANALYZE_FUNCS[analyzers[0]]
+        do_analysis(inputfile, outputfile, analyzer,
+                    jobs=1 if jobs is None else jobs, vector=vector,
+                    **options)
 
 if __name__ == "__main__":
     main(sys.argv[1:])
@@ -0,0 +1,95 @@
+#!/usr/bin/python2
+# -*- coding: UTF-8 -*-
+
+"""
+This script defines the analyzer plugin interface: the registered analyzers
+are fed the events of one shared pass over the trace data, so that several
+reports only cost one read of the trace
+"""
+
+# analyzer name, also its acrnalyze.py option, to analyzer class
+ANALYZERS = {}
+
+def register_analyzer(cls):
+    """register an analyzer class, to be used as a class decorator
+    Args:
+        cls: Analyzer subclass, with its name set
+    Return:
+        cls
+    """
+    assert cls.name not in ANALYZERS, "analyzer %s registered twice" % cls.name
+    ANALYZERS[cls.name] = cls
+    return cls
+
+class Analyzer(object):
+    """base of the analyzers
+
+    An analyzer is created for each trace data file, gets the events of the
+    file in order and in batches between begin() and end(), and the
+    analyzers of all the cpus are merged into the first one before its
+    report is written. Analyzers are pickled back from worker processes.
+    """
+
+    name = None
+
+    # also write a report per cpu, to ofile_cpu<cpuid>, for a directory
+    per_cpu_report = False
+
+    def __init__(self, **options):
+        """create the analyzer of a trace data file
+        Args:
+            options: analysis options from the command line, the ones an
+                     analyzer does not know are to be ignored
+        """
+        pass
+
+    def begin(self, freq):
+        """called before the first event of a trace data file
+        Args:
+            freq: CPU frequency, from the trace data file
+        Return:
+            None
+        """
+        pass
+
+    def feed(self, events):
+        """account a batch of events
+        Args:
+            events: list of (ev_id, tsc, info) tuples, in trace order
+        Return:
+            None
+        """
+        raise NotImplementedError
+
+    def end(self):
+        """called after the last event of a trace data file
+        Return:
+            None
+        """
+        pass
+
+    def valid(self):
+        """check if there is anything to report
+        Return:
+            True if the report can be written
+        """
+        return True
+
+    def merge(self, other):
+        """add the results of the analyzer of another cpu
+        Args:
+            other: analyzer of the same class
+        Return:
+            None
+        """
+        raise NotImplementedError
+
+    def report(self, ofile, freq):
+        """write the report
+        Args:
+            ofile: output report file
+            freq: CPU frequency
+        Return:
+            None
+        """
+        raise NotImplementedError
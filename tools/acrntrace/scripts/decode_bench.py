@@ -0,0 +1,83 @@
+#!/usr/bin/python2
+# -*- coding: UTF-8 -*-
+
+"""
+This script benchmarks the decoding of the VMEXIT_EPT_VIOLATION payload,
+the most frequent exit on GVT-g systems, against the former eval() based
+one, on a synthetic EPT-heavy trace
+"""
+
+import sys
+import random
+import timeit
+
+import vmexit_analyze as va
+from trace_event import DECODERS, field_decoder
+
+def gen_ept_trace(nr_exits):
+    """generate the lines of an EPT-heavy trace
+    Args:
+        nr_exits: number of exits, all of them EPT violations
+    Return:
+        list of trace data lines, without the cpu freq line
+    """
+    lines = []
+    tsc = 1000000
+    for i in xrange(nr_exits):
+        lines.append("0 | %d | VM_ENTER:\n" % (tsc))
+        lines.append("0 | %d | VM_EXIT: exit_reason 0x%016lx, "
+                     "guest_rip 0x%016lx\n" % (tsc + 1000, 0x30, 0xfff0))
+        lines.append("0 | %d | VMEXIT_EPT_VIOLATION: qual 0x%016lx, "
+                     "gpa 0x%016lx\n" % (tsc + 1003,
+                                         random.choice([0x181, 0x1a9]),
+                                         random.randrange(1 << 32)))
+        tsc += 2000
+    lines.append("0 | %d | VM_ENTER:\n" % (tsc))
+
+    return lines
+
+def bench(nr_exits):
+    """run the benchmark and print the results
+    Args:
+        nr_exits: number of exits of the synthetic trace
+    Return:
+        None
+    """
+    lines = gen_ept_trace(nr_exits)
+    infos = [va.parse_line(line)[2] for line in lines
+             if 'VMEXIT_EPT_VIOLATION' in line]
+    decode_ept = DECODERS['VMEXIT_EPT_VIOLATION']
+    decode_qual = field_decoder('VMEXIT_EPT_VIOLATION', 'qual')
+
+    def classify_eval():
+        for info in infos:
+            (eval(info[6:24]) & 0x38) == 0x28
+
+    def classify_decoder():
+        for info in infos:
+            (decode_ept(info)[0] & 0x38) == 0x28
+
+    def classify_field():
+        for info in infos:
+            (decode_qual(info) & 0x38) == 0x28
+
+    def parse():
+        va.VmExitAnalysis().feed(va.read_events(lines))
+
+    t_eval = min(timeit.repeat(classify_eval, number=1, repeat=3))
+    t_decoder = min(timeit.repeat(classify_decoder, number=1, repeat=3))
+    t_field = min(timeit.repeat(classify_field, number=1, repeat=3))
+    t_parse = min(timeit.repeat(parse, number=1, repeat=3))
+
+    print "EPT violation payloads: %d" % (len(infos))
+    print "eval() \t\t%.3f (Sec) \t%.0f events/Sec" % \
+          (t_eval, len(infos) / t_eval)
+    print "decoder \t\t%.3f (Sec) \t%.0f events/Sec \t%.1fx" % \
+          (t_decoder, len(infos) / t_decoder, t_eval / t_decoder)
+    print "field decoder \t%.3f (Sec) \t%.0f events/Sec \t%.1fx" % \
+          (t_field, len(infos) / t_field, t_eval / t_field)
+    print "vm_exit parse \t%.3f (Sec) \t%.0f lines/Sec" % \
+          (t_parse, len(lines) / t_parse)
+
+if __name__ == "__main__":
+    bench(int(sys.argv[1]) if len(sys.argv) > 1 else 200000)
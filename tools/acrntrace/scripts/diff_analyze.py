@@ -0,0 +1,241 @@
+#!/usr/bin/python2
+# -*- coding: UTF-8 -*-
+
+"""
+This script defines the function to compare the vm_exits of two traces,
+e.g. before and after a configuration change
+"""
+
+import csv
+import math
+
+import vmexit_analyze as va
+from trace_input import is_trace_dir
+from latency_hist import PERCENTILES
+
+# default size of the windows the exit rates are sampled over, in
+# milliseconds
+DIFF_WINDOW_MS = 100
+
+# a rate change is significant when Welch's t statistic of the windowed
+# rates of the two traces is beyond this
+DIFF_T_THRESHOLD = 3.0
+
+def analyze_files(ipath, jobs, vector, window):
+    """analyze the vm exits of the trace data files of a trace
+    Args:
+        ipath: trace data file, directory or tarball of a directory
+        jobs: number of worker processes the files of a directory are
+              analyzed by, 0 for one per host cpu
+        vector: do the vectorized analysis of raw trace data
+        window: timeline bucket size in milliseconds
+    Return:
+        list of (freq, stats) of the files of the trace
+    """
+    make_args = lambda path: (path, vector, window)
+    if is_trace_dir(ipath):
+        return [result for (cpu, path, result) in
+                va.map_trace_files(va.analyze_cpu_trace, ipath, make_args,
+                                   jobs)]
+
+    return [va.analyze_cpu_trace(make_args(ipath))]
+
+def window_rates(stats, freq, reason):
+    """get the exit rate of each window of a trace
+    Args:
+        stats: counters, with the timeline enabled
+        freq: CPU frequency
+        reason: exit reason
+    Return:
+        list of exits per second, one per window of the run, empty ones
+        included
+    """
+    bucket = stats['timeline_bucket']
+    timeline = stats['timeline']
+    idx = va.REASON_INDEX[reason]
+    window_sec = float(bucket) / (freq * 1000 * 1000)
+
+    rates = []
+    for window in xrange(stats['tsc_begin'] / bucket,
+                         stats['tsc_end'] / bucket + 1):
+        row = timeline.get(window)
+        rates.append((row[idx] if row is not None else 0) / window_sec)
+
+    return rates
+
+def welch_t(rates_a, rates_b):
+    """get Welch's t statistic of two samples
+    Args:
+        rates_a: first sample
+        rates_b: second sample
+    Return:
+        t statistic, positive if the mean of rates_b is higher, 0 if it
+        cannot be computed
+    """
+    if len(rates_a) < 2 or len(rates_b) < 2:
+        return 0.0
+
+    mean_a = sum(rates_a) / len(rates_a)
+    mean_b = sum(rates_b) / len(rates_b)
+    var_a = sum((r - mean_a) ** 2 for r in rates_a) / (len(rates_a) - 1)
+    var_b = sum((r - mean_b) ** 2 for r in rates_b) / (len(rates_b) - 1)
+    err = math.sqrt(var_a / len(rates_a) + var_b / len(rates_b))
+    if err == 0:
+        return 0.0 if mean_a == mean_b else float('inf') * (mean_b - mean_a)
+
+    return (mean_b - mean_a) / err
+
+def rate_and_pct(stats, freq, event):
+    """get the exit rate and time percentage of an exit reason
+    Args:
+        stats: counters
+        freq: CPU frequency
+        event: exit reason
+    Return:
+        tuple of (exits per second, percentage of the run time in exit)
+    """
+    rt_sec = float(stats['tsc_end'] - stats['tsc_begin']) / (freq * 1000 * 1000)
+    return (stats['nr_exits'][event] / rt_sec,
+            float(stats['time_in_exit'][event]) * 100 / stats['run_cycles'])
+
+def generate_report(ofile, result_a, result_b):
+    """ generate the comparison report
+    Args:
+        ofile: output report, saved to ofile_diff.csv
+        result_a: tuple of (CPU frequency, counters) of the first trace
+        result_b: tuple of (CPU frequency, counters) of the second trace
+    Return:
+        None
+    """
+    (freq_a, stats_a) = result_a
+    (freq_b, stats_b) = result_b
+
+    csv_name = ofile + '_diff.csv'
+    try:
+        with open(csv_name, 'w') as filep:
+            f_csv = csv.writer(filep)
+
+            print "\nEvent \tA NR_Exit/Sec \tB NR_Exit/Sec \tDelta(%) " \
+                  "\tA Time(%) \tB Time(%) \tt \tSignificant"
+            f_csv.writerow(['Exit_Reason', 'A NR_Exit/Sec', 'B NR_Exit/Sec',
+                            'Delta NR_Exit/Sec', 'Delta(%)',
+                            'A Time Percentage', 'B Time Percentage',
+                            'Delta Time Percentage', 't', 'Significant'])
+            for event in va.LIST_EVENTS:
+                if (stats_a['nr_exits'][event] == 0
+                        and stats_b['nr_exits'][event] == 0):
+                    continue
+
+                (rate_a, pct_a) = rate_and_pct(stats_a, freq_a, event)
+                (rate_b, pct_b) = rate_and_pct(stats_b, freq_b, event)
+                delta = ''
+                if rate_a != 0:
+                    delta = '%.2f' % ((rate_b - rate_a) * 100 / rate_a)
+                t_stat = welch_t(window_rates(stats_a, freq_a, event),
+                                 window_rates(stats_b, freq_b, event))
+                significant = 'yes' if abs(t_stat) > DIFF_T_THRESHOLD else ''
+
+                print "%s \t%.2f \t%.2f \t%s \t%2.2f \t%2.2f \t%.1f \t%s" % \
+                      (event, rate_a, rate_b, delta, pct_a, pct_b, t_stat,
+                       significant)
+                f_csv.writerow([event, '%.2f' % rate_a, '%.2f' % rate_b,
+                                '%.2f' % (rate_b - rate_a), delta,
+                                '%2.2f' % pct_a, '%2.2f' % pct_b,
+                                '%2.2f' % (pct_b - pct_a), '%.1f' % t_stat,
+                                significant])
+
+            f_csv.writerow([''])
+
+            # latency percentile shifts
+            print "\nEvent \tPercentile \tA (cycles) \tB (cycles) \tDelta"
+            f_csv.writerow(['Exit_Reason', 'Percentile', 'A(cycles)',
+                            'B(cycles)', 'Delta(cycles)'])
+            for event in va.LIST_EVENTS:
+                hist_a = stats_a['latency'][event]
+                hist_b = stats_b['latency'][event]
+                if hist_a.count == 0 and hist_b.count == 0:
+                    continue
+
+                for pct in PERCENTILES + ['Max']:
+                    if pct == 'Max':
+                        (value_a, value_b) = (hist_a.max, hist_b.max)
+                    else:
+                        value_a = hist_a.percentile(pct)
+                        value_b = hist_b.percentile(pct)
+                    name = pct if pct == 'Max' else 'P%s' % pct
+                    print "%s \t%s \t%d \t%d \t%d" % \
+                          (event, name, value_a, value_b, value_b - value_a)
+                    f_csv.writerow([event, name, value_a, value_b,
+                                    value_b - value_a])
+
+            f_csv.writerow([''])
+
+            # new and vanished vectors
+            irq_a = stats_a['irq_exits']
+            irq_b = stats_b['irq_exits']
+            print "\nVector \t\tA NR_Exit \tB NR_Exit \tStatus"
+            f_csv.writerow(['Vector', 'A NR_Exit', 'B NR_Exit', 'Status'])
+            for vec in sorted(set(irq_a.keys()) | set(irq_b.keys())):
+                status = ''
+                if vec not in irq_a:
+                    status = 'new'
+                elif vec not in irq_b:
+                    status = 'vanished'
+                print "%s \t%d \t%d \t%s" % \
+                      (vec, irq_a.get(vec, 0), irq_b.get(vec, 0), status)
+                f_csv.writerow([vec, irq_a.get(vec, 0), irq_b.get(vec, 0),
+                                status])
+
+    except IOError as err:
+        print "Output File Error: " + str(err)
+
+def merge_trace(path, results):
+    """merge the counters of the files of a trace
+    Args:
+        path: trace data file or directory, for the error message
+        results: list of (freq, stats) of the files of the trace
+    Return:
+        tuple of (freq, merged counters), or None if no valid file
+    """
+    stats_list = [stats for (freq, stats) in results
+                  if stats is not None and stats['run_cycles'] != 0]
+    if len(stats_list) == 0:
+        print "Invalid trace data in %s" % (path)
+        return None
+
+    return (results[0][0], va.merge_stats(stats_list))
+
+def analyze_diff(path_a, path_b, ofile, jobs=0, vector=False, timeline=0,
+                 **options):
+    """compare the vm exits of two traces
+    Args:
+        path_a: trace data file or directory, the reference
+        path_b: trace data file or directory, compared to path_a
+        ofile: output report file
+        jobs: number of worker processes, 0 for one per host cpu
+        vector: do the vectorized analysis of raw trace data, always done
+                if NumPy is available, text trace data is parsed anyway
+        timeline: size in milliseconds of the windows the exit rates are
+                  sampled over, 0 for DIFF_WINDOW_MS
+        options: other analysis options, not used here
+    Return:
+        None
+    """
+    print("VM exits comparison started... \n\tA: %s\n\tB: %s\n"
+          "\toutput file: %s_diff.csv" % (path_a, path_b, ofile))
+
+    # a tarball read as a stream cannot be parsed with the other trace, so
+    # the traces are parsed one after the other, each directory in parallel
+    window = timeline if timeline != 0 else DIFF_WINDOW_MS
+    results_a = analyze_files(path_a, jobs, vector, window)
+    results_b = analyze_files(path_b, jobs, vector, window)
+    if len(results_a) == 0 or len(results_b) == 0:
+        print "No trace data file to compare"
+        return
+
+    trace_a = merge_trace(path_a, results_a)
+    trace_b = merge_trace(path_b, results_b)
+    if trace_a is None or trace_b is None:
+        return
+
+    generate_report(ofile, trace_a, trace_b)
@@ -0,0 +1,284 @@
+#!/usr/bin/python2
+# -*- coding: UTF-8 -*-
+
+"""
+This script defines the guest run analyzer, which reports the time the
+guest runs between two exits: the distribution of the run slices from a
+VM_ENTER to the next exit, the fraction of the time the guest ran, the
+longest run, and the periods the exits took more than a threshold of
+the time
+"""
+
+import csv
+from array import array
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from latency_hist import LatencyHistogram, PERCENTILES
+from analyzer import Analyzer, register_analyzer
+
+# default size of the windows the exit overhead is computed over, in
+# milliseconds
+RUN_BUCKET_MS = 10
+
+# default exit overhead, in percent of a window, beyond which the window
+# is reported
+OVERHEAD_PCT = 20.0
+
+def overhead_periods(bucket_cycles, bucket, threshold, nr_cpus=1):
+    """find the periods the exit overhead is beyond a threshold
+    Args:
+        bucket_cycles: dict of bucket index to cycles in exit, summed over
+                       the cpus
+        bucket: bucket size in cycles
+        threshold: exit overhead, in percent of a bucket of all the cpus
+        nr_cpus: number of cpus the cycles in exit are summed over
+    Return:
+        list of (first tsc, last tsc + 1, highest overhead in percent of a
+        bucket, cycles in exit) of the runs of consecutive buckets beyond
+        threshold
+    """
+    periods = []
+    for idx in sorted(bucket_cycles.keys()):
+        pct = float(bucket_cycles[idx]) * 100 / (bucket * nr_cpus)
+        if pct <= threshold:
+            continue
+
+        if len(periods) != 0 and periods[-1][1] == idx * bucket:
+            (start, stop, max_pct, cycles) = periods[-1]
+            periods[-1] = (start, stop + bucket, max(max_pct, pct),
+                           cycles + bucket_cycles[idx])
+        else:
+            periods.append((idx * bucket, (idx + 1) * bucket, pct,
+                            bucket_cycles[idx]))
+
+    return periods
+
+@register_analyzer
+class GuestRunAnalyzer(Analyzer):
+    """guest run report, on the shared pass over the trace data
+
+    The events only pair the VM_ENTER and exit tsc of each file, as
+    exit_durations() of the vectorized analysis: an exit starts at its
+    latest VM_EXIT, or at the previous VM_ENTER if the VM_EXIT is lost.
+    The run slices and the cycles in exit per bucket are then computed at
+    once over the paired arrays of each batch of events, with NumPy if
+    available; only the latest VM_ENTER and VM_EXIT tsc are carried to the
+    next batch. The cycles of an exit are accounted to the bucket it
+    starts in; the buckets of the cpus are summed when merged, and the
+    periods of the system-wide report are the ones the exits took more
+    than the threshold of all the cpus.
+    """
+
+    name = 'guest_run'
+    per_cpu_report = True
+
+    def __init__(self, timeline=0, overhead=0, **options):
+        self.bucket_ms = timeline if timeline != 0 else RUN_BUCKET_MS
+        self.threshold = overhead if overhead != 0 else OVERHEAD_PCT
+        self.bucket = 0
+        self.slices = LatencyHistogram()
+        # sum of the run slices, and of the time from the first to the last
+        # VM_ENTER, of all the cpus
+        self.run_cycles = 0
+        self.wall_cycles = 0
+        # (cycles, tsc of the VM_ENTER) of the longest run slice
+        self.longest = (0, 0)
+        # bucket index to cycles in exit, and number of cpus summed in
+        self.bucket_cycles = {}
+        self.nr_cpus = 0
+        self.tsc_begin = 0
+        # first and latest VM_ENTER, and VM_EXIT since, of the file
+        self.tsc_first = None
+        self.tsc_enter = None
+        self.tsc_exit = None
+
+    def begin(self, freq):
+        self.bucket = long(self.bucket_ms * freq * 1000)
+        self.tsc_first = None
+        self.tsc_enter = None
+        self.tsc_exit = None
+
+    def feed(self, events):
+        # per exit of the batch: VM_ENTER the run starts at, exit tsc and
+        # VM_ENTER closing the exit
+        run_tsc = array('L')
+        exit_tsc = array('L')
+        enter_tsc = array('L')
+        tsc_enter = self.tsc_enter
+        tsc_exit = self.tsc_exit
+
+        for (ev_id, tsc, info) in events:
+            if ev_id == 'VM_ENTER':
+                if tsc_enter is not None:
+                    run_tsc.append(tsc_enter)
+                    exit_tsc.append(tsc_exit if tsc_exit is not None
+                                    else tsc_enter)
+                    enter_tsc.append(tsc)
+                else:
+                    self.tsc_first = tsc
+                tsc_enter = tsc
+                tsc_exit = None
+            elif ev_id == 'VM_EXIT':
+                tsc_exit = tsc
+
+        self.tsc_enter = tsc_enter
+        self.tsc_exit = tsc_exit
+        if len(exit_tsc) == 0:
+            return
+
+        if np is not None:
+            self._account_vector(run_tsc, exit_tsc, enter_tsc)
+        else:
+            self._account_loop(run_tsc, exit_tsc, enter_tsc)
+
+    def _add_bucket(self, idx, cycles):
+        self.bucket_cycles[idx] = self.bucket_cycles.get(idx, 0) + cycles
+
+    def _account_vector(self, run_tsc, exit_tsc, enter_tsc):
+        """account the exits of a batch with NumPy
+        Args:
+            run_tsc: array of the VM_ENTER each run starts at
+            exit_tsc: array of the tsc each exit starts at
+            enter_tsc: array of the VM_ENTER closing each exit
+        Return:
+            None
+        """
+        run_tsc = np.frombuffer(run_tsc, dtype=np.uint64).astype(np.int64)
+        exit_tsc = np.frombuffer(exit_tsc, dtype=np.uint64).astype(np.int64)
+        enter_tsc = np.frombuffer(enter_tsc, dtype=np.uint64)
+        enter_tsc = enter_tsc.astype(np.int64)
+
+        slices = exit_tsc - run_tsc
+        durations = enter_tsc - exit_tsc
+        self.slices.record_array(slices)
+        self.run_cycles += long(slices.sum())
+
+        idx = int(slices.argmax())
+        if slices[idx] > self.longest[0]:
+            self.longest = (long(slices[idx]), long(run_tsc[idx]))
+
+        buckets = exit_tsc // self.bucket
+        first = buckets.min()
+        # float64 accumulation is exact as long as a bucket is below 2^53
+        cycles = np.bincount(buckets - first, weights=durations)
+        for row in np.flatnonzero(cycles):
+            self._add_bucket(long(first + row), long(round(cycles[row])))
+
+    def _account_loop(self, run_tsc, exit_tsc, enter_tsc):
+        """account the exits of a batch one at a time
+        Args:
+            run_tsc: array of the VM_ENTER each run starts at
+            exit_tsc: array of the tsc each exit starts at
+            enter_tsc: array of the VM_ENTER closing each exit
+        Return:
+            None
+        """
+        for i in xrange(len(exit_tsc)):
+            run = exit_tsc[i] - run_tsc[i]
+            self.slices.record(run)
+            self.run_cycles += run
+            if run > self.longest[0]:
+                self.longest = (run, run_tsc[i])
+
+            self._add_bucket(exit_tsc[i] / self.bucket,
+                             enter_tsc[i] - exit_tsc[i])
+
+    def end(self):
+        if self.tsc_first is not None and self.tsc_enter != self.tsc_first:
+            self.nr_cpus = 1
+            self.wall_cycles += self.tsc_enter - self.tsc_first
+            if self.tsc_begin == 0 or self.tsc_first < self.tsc_begin:
+                self.tsc_begin = self.tsc_first
+
+        self.tsc_first = None
+        self.tsc_enter = None
+        self.tsc_exit = None
+
+    def valid(self):
+        return self.wall_cycles != 0
+
+    def merge(self, other):
+        self.slices.merge(other.slices)
+        self.run_cycles += other.run_cycles
+        self.wall_cycles += other.wall_cycles
+        self.longest = max(self.longest, other.longest)
+        for (idx, cycles) in other.bucket_cycles.items():
+            self.bucket_cycles[idx] = self.bucket_cycles.get(idx, 0) + cycles
+        self.nr_cpus += other.nr_cpus
+        if other.tsc_begin != 0:
+            if self.tsc_begin == 0 or other.tsc_begin < self.tsc_begin:
+                self.tsc_begin = other.tsc_begin
+
+    def report(self, ofile, freq):
+        generate_report(ofile, freq, self)
+
+def generate_report(ofile, freq, runs):
+    """ generate guest run report
+    Args:
+        ofile: output report, saved to ofile_guest_run.csv
+        freq: CPU frequency of the device trace data from
+        runs: GuestRunAnalyzer
+    Return:
+        None
+    """
+    cycles_per_sec = float(freq) * 1000 * 1000
+    run_pct = float(runs.run_cycles) * 100 / runs.wall_cycles
+    (longest, longest_tsc) = runs.longest
+    periods = overhead_periods(runs.bucket_cycles, runs.bucket,
+                               runs.threshold, runs.nr_cpus)
+
+    csv_name = ofile + '_guest_run.csv'
+    try:
+        with open(csv_name, 'w') as filep:
+            f_csv = csv.writer(filep)
+
+            print "\nNR_Run \tRun Percentage \tLongest Run \tLongest Run At(Sec)"
+            print "%d \t%2.2f \t%d \t%.6f" % \
+                  (runs.slices.count, run_pct, longest,
+                   (longest_tsc - runs.tsc_begin) / cycles_per_sec)
+            f_csv.writerow(['NR_Run', 'Run Cycles', 'Total Cycles',
+                            'Run Percentage', 'Longest Run(cycles)',
+                            'Longest Run At(Sec)'])
+            f_csv.writerow([runs.slices.count, runs.run_cycles,
+                            runs.wall_cycles, '%2.2f' % run_pct, longest,
+                            '%.6f' % ((longest_tsc - runs.tsc_begin) /
+                                      cycles_per_sec)])
+
+            f_csv.writerow([''])
+
+            # run slice distribution
+            min_run = runs.slices.min if runs.slices.min is not None else 0
+            values = [min_run] + [v for (p, v) in runs.slices.percentiles()]
+            print "\nMin \t%s \tMax" % \
+                  " \t".join("P%s" % pct for pct in PERCENTILES)
+            print " \t".join("%d" % v for v in values + [runs.slices.max])
+            f_csv.writerow(['Min_Run(cycles)'] +
+                           ['P%s_Run(cycles)' % pct for pct in PERCENTILES] +
+                           ['Max_Run(cycles)'])
+            f_csv.writerow(values + [runs.slices.max])
+
+            f_csv.writerow([''])
+            f_csv.writerow(['Run_From(cycles)', 'Run_To(cycles)', 'NR_Run'])
+            for (low, high, count) in runs.slices.log2_histogram():
+                f_csv.writerow([low, high, count])
+
+            f_csv.writerow([''])
+
+            # periods of exit overhead beyond the threshold, of all the cpus
+            print "\nOverhead > %.1f%% of %d CPU(s) \tFrom(Sec) \tTo(Sec) " \
+                  "\tMax Overhead(%%)" % (runs.threshold, runs.nr_cpus)
+            f_csv.writerow(['From(Sec)', 'To(Sec)', 'Max Overhead Percentage',
+                            'Time in Exit(cycles)'])
+            for (start, stop, max_pct, cycles) in periods:
+                start_sec = max(start - runs.tsc_begin, 0) / cycles_per_sec
+                stop_sec = (stop - runs.tsc_begin) / cycles_per_sec
+                print "\t\t%.6f \t%.6f \t%2.2f" % (start_sec, stop_sec, max_pct)
+                f_csv.writerow(['%.6f' % start_sec, '%.6f' % stop_sec,
+                                '%2.2f' % max_pct, cycles])
+
+    except IOError as err:
+        print "Output File Error: " + str(err)
@@ -0,0 +1,363 @@
+#!/usr/bin/python2
+# -*- coding: UTF-8 -*-
+
+"""
+This script defines the function to do the exit hotspot analysis, the exit
+counts and cycles are grouped by guest RIP, GPA page, I/O port and MSR
+"""
+
+import csv
+
+import vmexit_analyze as va
+from trace_event import DECODERS
+from analyzer import Analyzer, register_analyzer
+from trace_merge import file_events
+from trace_cache import cached_path
+
+HOTSPOT_TOP = 20
+
+# number of keys tracked exactly by each HotspotCounter is
+# HOTSPOT_CAPACITY to 2 * HOTSPOT_CAPACITY
+HOTSPOT_CAPACITY = 1024
+
+# count-min sketch size
+CMS_WIDTH = 4096
+CMS_DEPTH = 4
+
+# hotspot dimensions, in report order
+LIST_HOTSPOTS = [
+    ('rip', 'Guest_RIP'),
+    ('gpa_page', 'GPA_Page'),
+    ('io_port', 'IO_Port'),
+    ('msr', 'MSR')
+]
+
+class HotspotCounter(object):
+    """top-K exit counts and cycles by key, with bounded memory
+
+    The heaviest keys by cycles are counted exactly in a dict which is
+    pruned back to capacity keys when it doubles. The counts of the pruned
+    keys go to a count-min sketch: a pruned key coming back takes them
+    back, over-estimated at most by the sketch error over the pruned keys,
+    instead of losing its past, while a new key starts from 0.
+    """
+
+    def __init__(self, capacity=HOTSPOT_CAPACITY):
+        self.capacity = capacity
+        self.entries = {}
+        self.cms_count = [[0] * CMS_WIDTH for i in range(CMS_DEPTH)]
+        self.cms_cycles = [[0] * CMS_WIDTH for i in range(CMS_DEPTH)]
+        self.total_count = 0
+        self.total_cycles = 0
+
+    def _slots(self, key):
+        return [hash((row, key)) % CMS_WIDTH for row in range(CMS_DEPTH)]
+
+    def add(self, key, cycles, count=1):
+        """account exits of a key
+        Args:
+            key: hashable key, e.g. guest RIP
+            cycles: cycles in the exits
+            count: number of exits
+        Return:
+            None
+        """
+        self.total_count += count
+        self.total_cycles += cycles
+
+        entry = self.entries.get(key)
+        if entry is not None:
+            entry[0] += count
+            entry[1] += cycles
+            return
+
+        entry = self._unprune(self._slots(key))
+        self.entries[key] = [entry[0] + count, entry[1] + cycles]
+        if len(self.entries) > 2 * self.capacity:
+            self._prune()
+
+    def _estimate(self, slots):
+        """get the pruned counts of a key from the sketch"""
+        return [min(self.cms_count[row][slot]
+                    for (row, slot) in enumerate(slots)),
+                min(self.cms_cycles[row][slot]
+                    for (row, slot) in enumerate(slots))]
+
+    def _take(self, slots, entry):
+        """remove counts taken back by a key from the sketch"""
+        for (row, slot) in enumerate(slots):
+            self.cms_count[row][slot] -= entry[0]
+            self.cms_cycles[row][slot] -= entry[1]
+
+    def _unprune(self, slots):
+        """take the pruned counts of a key back from the sketch"""
+        entry = self._estimate(slots)
+        self._take(slots, entry)
+        return entry
+
+    def _prune(self):
+        entries = sorted(self.entries.items(), key=lambda e: e[1][1],
+                         reverse=True)
+        self.entries = dict(entries[:self.capacity])
+        for (key, (count, cycles)) in entries[self.capacity:]:
+            for (row, slot) in enumerate(self._slots(key)):
+                self.cms_count[row][slot] += count
+                self.cms_cycles[row][slot] += cycles
+
+    def merge(self, other):
+        """add the exits accounted by another counter
+        Args:
+            other: HotspotCounter
+        Return:
+            None
+        """
+        # the exact counts of a key are kept whichever side has them, the
+        # sketch only stands for the side which pruned the key
+        taken = []
+        entries = {}
+        for key in set(self.entries.keys()) | set(other.entries.keys()):
+            slots = self._slots(key)
+            entry = self.entries.get(key)
+            if entry is None:
+                entry = self._unprune(slots)
+            other_entry = other.entries.get(key)
+            if other_entry is None:
+                other_entry = other._estimate(slots)
+                taken.append((slots, other_entry))
+            entries[key] = [entry[0] + other_entry[0],
+                            entry[1] + other_entry[1]]
+
+        for row in range(CMS_DEPTH):
+            for slot in range(CMS_WIDTH):
+                self.cms_count[row][slot] += other.cms_count[row][slot]
+                self.cms_cycles[row][slot] += other.cms_cycles[row][slot]
+        for (slots, entry) in taken:
+            self._take(slots, entry)
+
+        self.entries = entries
+        self.total_count += other.total_count
+        self.total_cycles += other.total_cycles
+        if len(self.entries) > 2 * self.capacity:
+            self._prune()
+
+    def top(self, nr_keys):
+        """get the heaviest keys
+        Args:
+            nr_keys: number of keys
+        Return:
+            list of (key, count, cycles), by decreasing cycles
+        """
+        entries = sorted(self.entries.items(), key=lambda e: e[1][1],
+                         reverse=True)[:nr_keys]
+        return [(key, count, cycles) for (key, (count, cycles)) in entries]
+
+def new_hotspots():
+    """create the hotspot counters
+    Return:
+        dict of dimension to HotspotCounter
+    """
+    return dict((dim, HotspotCounter()) for (dim, title) in LIST_HOTSPOTS)
+
+def account_exit(hotspots, events, tsc_exit, tsc_enter):
+    """account one exit in the hotspot counters
+    Args:
+        hotspots: dict returned by new_hotspots()
+        events: list of (ev_id, tsc, info) between two VM_ENTER
+        tsc_exit: tsc of the previous VM_ENTER, used if VM_EXIT is lost
+        tsc_enter: tsc of the VM_ENTER closing the exit
+    Return:
+        None
+    """
+    keys = []
+    for (ev_id, tsc, info) in events:
+        try:
+            if ev_id == 'VM_EXIT':
+                tsc_exit = tsc
+                keys.append(('rip', DECODERS[ev_id](info)[1]))
+            elif ev_id == 'VMEXIT_EPT_VIOLATION':
+                keys.append(('gpa_page', DECODERS[ev_id](info)[1] >> 12))
+            elif ev_id == 'VMEXIT_IO_INSTRUCTION':
+                keys.append(('io_port', DECODERS[ev_id](info)[0]))
+            elif ev_id in ('VMEXIT_RDMSR', 'VMEXIT_WRMSR'):
+                keys.append(('msr', DECODERS[ev_id](info)[0]))
+        except ValueError:
+            # skip the malformed payload, the other keys of the exit count
+            continue
+
+    cycles = tsc_enter - tsc_exit
+    for (dim, key) in keys:
+        hotspots[dim].add(key, cycles)
+
+@register_analyzer
+class HotspotAnalyzer(Analyzer):
+    """exit hotspot report, on the shared pass over the trace data"""
+
+    name = 'hotspot'
+
+    def __init__(self, top=HOTSPOT_TOP, **options):
+        self.top = top
+        self.hotspots = new_hotspots()
+        self.run_cycles = 0
+        self.tsc_begin = 0
+        self.tsc_last = 0
+        self.pending = []
+
+    def begin(self, freq):
+        self.tsc_begin = 0
+        self.tsc_last = 0
+        self.pending = []
+
+    def feed(self, events):
+        for event in events:
+            if event[0] == 'VM_ENTER':
+                if self.tsc_begin == 0:
+                    self.tsc_begin = event[1]
+                else:
+                    account_exit(self.hotspots, self.pending, self.tsc_last,
+                                 event[1])
+                self.tsc_last = event[1]
+                self.pending = []
+            elif self.tsc_begin != 0:
+                self.pending.append(event)
+
+    def end(self):
+        self.run_cycles += self.tsc_last - self.tsc_begin
+        self.pending = []
+
+    def valid(self):
+        return self.run_cycles != 0
+
+    def merge(self, other):
+        for (dim, title) in LIST_HOTSPOTS:
+            self.hotspots[dim].merge(other.hotspots[dim])
+        self.run_cycles += other.run_cycles
+
+    def report(self, ofile, freq):
+        generate_report(ofile, self.hotspots, self.run_cycles, self.top)
+
+def parse_hotspots(ifile):
+    """parse the trace data file in a single pass
+    Args:
+        ifile: input trace data file
+    Return:
+        tuple of (hotspot counters, run time in cycles)
+    """
+    analyzer = HotspotAnalyzer()
+    analyzer.begin(None)
+
+    try:
+        analyzer.feed(file_events(cached_path(ifile)))
+
+    except IOError as err:
+        print "Input File Error: " + str(err)
+
+    analyzer.end()
+
+    return (analyzer.hotspots, analyzer.run_cycles)
+
+def format_key(dim, key):
+    """format a hotspot key for the report
+    Args:
+        dim: hotspot dimension
+        key: hotspot key
+    Return:
+        string
+    """
+    if dim == 'gpa_page':
+        return '0x%016x' % (key << 12)
+    elif dim == 'io_port':
+        return '0x%04x' % key
+    elif dim == 'msr':
+        return '0x%08x' % key
+
+    return '0x%016x' % key
+
+def generate_report(ofile, hotspots, run_cycles, top):
+    """ generate hotspot report
+    Args:
+        ofile: output report, saved to ofile_hotspot.csv
+        hotspots: hotspot counters
+        run_cycles: run time in cycles, of all the cpus
+        top: number of hotspots reported per dimension
+    Return:
+        None
+    """
+    csv_name = ofile + '_hotspot.csv'
+    try:
+        with open(csv_name, 'w') as filep:
+            f_csv = csv.writer(filep)
+
+            for (dim, title) in LIST_HOTSPOTS:
+                counter = hotspots[dim]
+
+                print "\n%s \tNR_Exit \tTime Consumed \tTime Percentage" \
+                      % (title)
+                f_csv.writerow([title, 'NR_Exit', 'Time Consumed(cycles)',
+                                'Time Percentage'])
+                for (key, count, cycles) in counter.top(top):
+                    pct = float(cycles) * 100 / float(run_cycles)
+                    print "%s \t%d \t%d \t%2.2f" % \
+                          (format_key(dim, key), count, cycles, pct)
+                    f_csv.writerow([format_key(dim, key), count, cycles,
+                                    '%2.2f' % (pct)])
+
+                f_csv.writerow(["Total", counter.total_count,
+                                counter.total_cycles])
+                # insert a empty row to separate two tables
+                f_csv.writerow([''])
+
+    except IOError as err:
+        print "Output File Error: " + str(err)
+
+def analyze_hotspot(ifile, ofile, top=HOTSPOT_TOP, **options):
+    """do the exit hotspot analysis
+    Args:
+        ifile: input trace data file
+        ofile: output report file
+        top: number of hotspots reported per dimension
+        options: other analysis options, not used here
+    Return:
+        None
+    """
+    print("Exit hotspot analysis started... \n\tinput file: %s\n"
+          "\toutput file: %s_hotspot.csv" % (ifile, ofile))
+
+    (hotspots, run_cycles) = parse_hotspots(ifile)
+    if run_cycles == 0:
+        print "Invalid trace data file %s" % (ifile)
+        return
+
+    generate_report(ofile, hotspots, run_cycles, top)
+
+def analyze_hotspot_dir(idir, ofile, jobs=0, top=HOTSPOT_TOP, **options):
+    """do the exit hotspot analysis of all the cpus in parallel
+    Args:
+        idir: input trace data directory
+        ofile: output report file
+        jobs: number of worker processes, 0 for one per host cpu
+        top: number of hotspots reported per dimension
+        options: other analysis options, not used here
+    Return:
+        None
+    """
+    print("Exit hotspot analysis started... \n\tinput dir: %s\n"
+          "\toutput file: %s_hotspot.csv" % (idir, ofile))
+
+    results = va.map_trace_files(parse_hotspots, idir, lambda path: path,
+                                 jobs)
+    if len(results) == 0:
+        print "No trace data file in %s" % (idir)
+        return
+
+    hotspots = new_hotspots()
+    run_cycles = 0
+    for (cpu, path, (cpu_hotspots, cpu_cycles)) in results:
+        for (dim, title) in LIST_HOTSPOTS:
+            hotspots[dim].merge(cpu_hotspots[dim])
+        run_cycles += cpu_cycles
+
+    if run_cycles == 0:
+        print "Invalid trace data in %s" % (idir)
+        return
+
+    generate_report(ofile, hotspots, run_cycles, top)
@@ -0,0 +1,231 @@
+#!/usr/bin/python2
+# -*- coding: UTF-8 -*-
+
+"""
+This script defines the interrupt analyzer, which reports the exits of
+each exception, external interrupt and virtual EOI vector: counts, rates,
+time in exit, inter-arrival distribution and rate over time
+"""
+
+import csv
+from array import array
+
+from trace_event import NR_VECTORS, VECTOR_DECODERS
+from latency_hist import LatencyHistogram, PERCENTILES
+from analyzer import Analyzer, register_analyzer
+
+# default size of the time buckets, in milliseconds
+IRQ_BUCKET_MS = 10
+
+# vector sources, in report order: (event, title)
+LIST_IRQ_SOURCES = [
+    ('VMEXIT_EXCEPTION_OR_NMI', 'Exception'),
+    ('VMEXIT_EXTERNAL_INTERRUPT', 'Interrupt'),
+    ('VMEXIT_APICV_VIRT_EOI', 'Virt_EOI')
+]
+
+# event to the first slot of its vectors, a slot counts one vector of one
+# source: source index * NR_VECTORS + vector
+SOURCE_BASE = dict((event, idx * NR_VECTORS)
+                   for (idx, (event, title)) in enumerate(LIST_IRQ_SOURCES))
+
+NR_SLOTS = len(LIST_IRQ_SOURCES) * NR_VECTORS
+
+def slot_name(slot):
+    """get the source and vector of a slot
+    Args:
+        slot: slot index
+    Return:
+        tuple of (source title, vector formatted as 0x%02x)
+    """
+    return (LIST_IRQ_SOURCES[slot / NR_VECTORS][1],
+            '0x%02x' % (slot % NR_VECTORS))
+
+@register_analyzer
+class IrqAnalyzer(Analyzer):
+    """interrupt report, on the shared pass over the trace data
+
+    The counters are arrays indexed by slot. The time in exit of a vector
+    is the time of the exits it shows up in, from VM_EXIT (or the previous
+    VM_ENTER if it is lost) to VM_ENTER. Only the events between the first
+    and the last VM_ENTER are accounted, as in the vm_exit analysis.
+    """
+
+    name = 'irq'
+    per_cpu_report = True
+
+    def __init__(self, timeline=0, **options):
+        self.bucket_ms = timeline if timeline != 0 else IRQ_BUCKET_MS
+        self.bucket = 0
+        self.counts = array('L', [0]) * NR_SLOTS
+        self.cycles = array('L', [0]) * NR_SLOTS
+        # slot to LatencyHistogram of the inter-arrival cycles
+        self.intervals = {}
+        # bucket index (tsc / bucket) to dict of slot to count
+        self.buckets = {}
+        self.tsc_begin = 0
+        self.tsc_end = 0
+        self.run_cycles = 0
+        self.last_tsc = array('L', [0]) * NR_SLOTS
+        self.tsc_first = 0
+        self.tsc_enter = 0
+        self.tsc_exit = 0
+        self.pending = []
+
+    def begin(self, freq):
+        self.bucket = long(self.bucket_ms * freq * 1000)
+        self.last_tsc = array('L', [0]) * NR_SLOTS
+        self.tsc_first = 0
+        self.tsc_enter = 0
+        self.pending = []
+
+    def _account(self, slot, tsc, cycles):
+        """account one vector of an exit"""
+        self.counts[slot] += 1
+        self.cycles[slot] += cycles
+
+        last = self.last_tsc[slot]
+        if last != 0:
+            hist = self.intervals.get(slot)
+            if hist is None:
+                hist = LatencyHistogram()
+                self.intervals[slot] = hist
+            hist.record(tsc - last)
+        self.last_tsc[slot] = tsc
+
+        idx = tsc / self.bucket
+        row = self.buckets.get(idx)
+        if row is None:
+            row = {}
+            self.buckets[idx] = row
+        row[slot] = row.get(slot, 0) + 1
+
+    def feed(self, events):
+        for (ev_id, tsc, info) in events:
+            if ev_id == 'VM_ENTER':
+                if self.tsc_first == 0:
+                    self.tsc_first = tsc
+                else:
+                    for (slot, tsc_vec) in self.pending:
+                        self._account(slot, tsc_vec, tsc - self.tsc_exit)
+                self.tsc_enter = tsc
+                self.tsc_exit = tsc
+                self.pending = []
+            elif self.tsc_first == 0:
+                continue
+            elif ev_id == 'VM_EXIT':
+                self.tsc_exit = tsc
+            elif ev_id in SOURCE_BASE:
+                try:
+                    vec = VECTOR_DECODERS[ev_id](info)
+                except ValueError:
+                    continue
+                if vec < NR_VECTORS:
+                    self.pending.append((SOURCE_BASE[ev_id] + vec, tsc))
+
+    def end(self):
+        # the exit after the last VM_ENTER is not accounted
+        if self.tsc_first != 0:
+            self.run_cycles += self.tsc_enter - self.tsc_first
+            if self.tsc_begin == 0 or self.tsc_first < self.tsc_begin:
+                self.tsc_begin = self.tsc_first
+            self.tsc_end = max(self.tsc_end, self.tsc_enter)
+        self.pending = []
+
+    def valid(self):
+        return self.run_cycles != 0
+
+    def merge(self, other):
+        for slot in xrange(NR_SLOTS):
+            self.counts[slot] += other.counts[slot]
+            self.cycles[slot] += other.cycles[slot]
+        for (slot, hist) in other.intervals.items():
+            if slot in self.intervals:
+                self.intervals[slot].merge(hist)
+            else:
+                self.intervals[slot] = hist
+        for (idx, other_row) in other.buckets.items():
+            row = self.buckets.setdefault(idx, {})
+            for (slot, count) in other_row.items():
+                row[slot] = row.get(slot, 0) + count
+        if other.tsc_begin != 0:
+            if self.tsc_begin == 0 or other.tsc_begin < self.tsc_begin:
+                self.tsc_begin = other.tsc_begin
+        self.tsc_end = max(self.tsc_end, other.tsc_end)
+        self.run_cycles += other.run_cycles
+
+    def report(self, ofile, freq):
+        generate_report(ofile, freq, self)
+
+def generate_report(ofile, freq, irqs):
+    """ generate interrupt report
+    Args:
+        ofile: output report, saved to ofile_irq.csv, the rates over time
+               to ofile_irq_timeline.csv
+        freq: CPU frequency of the device trace data from
+        irqs: IrqAnalyzer
+    Return:
+        None
+    """
+    rt_sec = float(irqs.tsc_end - irqs.tsc_begin) / (float(freq) * 1000 * 1000)
+    slots = [slot for slot in xrange(NR_SLOTS) if irqs.counts[slot] != 0]
+
+    csv_name = ofile + '_irq.csv'
+    try:
+        with open(csv_name, 'w') as filep:
+            f_csv = csv.writer(filep)
+
+            print "\nSource \tVector \tNR_Exit \tNR_Exit/Sec \tTime Consumed " \
+                  "\tTime Percentage \tMin Interval \t%s" % \
+                  " \t".join("P%s" % pct for pct in PERCENTILES)
+            f_csv.writerow(['Source', 'Vector', 'NR_Exit', 'NR_Exit/Sec',
+                            'Time Consumed(cycles)', 'Time Percentage',
+                            'Min_Interval(cycles)'] +
+                           ['P%s_Interval(cycles)' % pct
+                            for pct in PERCENTILES])
+            for slot in slots:
+                rate = float(irqs.counts[slot]) / rt_sec if rt_sec > 0 else 0
+                pct = float(irqs.cycles[slot]) * 100 / float(irqs.run_cycles)
+                hist = irqs.intervals.get(slot, LatencyHistogram())
+                values = [hist.min if hist.min is not None else 0]
+                values += [value for (p, value) in hist.percentiles()]
+
+                print "%s \t%s \t%d \t%.2f \t%d \t%2.2f \t%s" % \
+                      (slot_name(slot) + (irqs.counts[slot], rate,
+                                          irqs.cycles[slot], pct,
+                                          " \t".join("%d" % v
+                                                     for v in values)))
+                f_csv.writerow(list(slot_name(slot)) +
+                               [irqs.counts[slot], '%.2f' % rate,
+                                irqs.cycles[slot], '%2.2f' % pct] + values)
+
+            f_csv.writerow([''])
+
+            # inter-arrival histograms, to spot the interrupt storms
+            f_csv.writerow(['Source', 'Vector', 'Interval_From(cycles)',
+                            'Interval_To(cycles)', 'NR_Exit'])
+            for slot in slots:
+                if slot not in irqs.intervals:
+                    continue
+                for (low, high, count) in \
+                        irqs.intervals[slot].log2_histogram():
+                    f_csv.writerow(list(slot_name(slot)) + [low, high, count])
+
+        if len(irqs.buckets) == 0:
+            return
+
+        with open(ofile + '_irq_timeline.csv', 'w') as filep:
+            f_csv = csv.writer(filep)
+            f_csv.writerow(['Time(Sec)'] + ['%s %s(NR/Sec)' % slot_name(slot)
+                                            for slot in slots])
+
+            bucket_sec = irqs.bucket_ms / 1000.0
+            first = min(irqs.buckets)
+            for idx in xrange(first, max(irqs.buckets) + 1):
+                row = irqs.buckets.get(idx, {})
+                f_csv.writerow(['%.6f' % ((idx - first) * bucket_sec)] +
+                               ['%.0f' % (row.get(slot, 0) / bucket_sec)
+                                for slot in slots])
+
+    except IOError as err:
+        print "Output File Error: " + str(err)
@@ -0,0 +1,177 @@
+#!/usr/bin/python2
+# -*- coding: UTF-8 -*-
+
+"""
+This script defines the latency histogram, a memory-bounded sketch of a
+latency distribution with HDR-style log-linear buckets
+"""
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# every power of 2 range is split into 2^SUB_BITS linear buckets, so the
+# value a bucket stands for is within 1/2^SUB_BITS of the recorded one
+SUB_BITS = 4
+SUB_COUNT = 1 << SUB_BITS
+
+PERCENTILES = [50, 90, 99, 99.9]
+
+def bucket_index(value):
+    """get the bucket of a value
+    Args:
+        value: non-negative integer
+    Return:
+        bucket index, values below 2 * SUB_COUNT have their own bucket
+    """
+    if value < 2 * SUB_COUNT:
+        return value
+
+    shift = value.bit_length() - 1 - SUB_BITS
+    return shift * SUB_COUNT + (value >> shift)
+
+def bucket_range(idx):
+    """get the range of values in a bucket
+    Args:
+        idx: bucket index
+    Return:
+        tuple of (lowest value, highest value + 1)
+    """
+    if idx < 2 * SUB_COUNT:
+        return (idx, idx + 1)
+
+    shift = idx / SUB_COUNT - 1
+    low = (idx % SUB_COUNT + SUB_COUNT) << shift
+    return (low, low + (1 << shift))
+
+class LatencyHistogram(object):
+    """latency histogram, with count, total, min and max kept exactly"""
+
+    __slots__ = ['buckets', 'count', 'total', 'min', 'max']
+
+    def __init__(self):
+        self.buckets = {}
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = 0
+
+    def __getstate__(self):
+        return (self.buckets, self.count, self.total, self.min, self.max)
+
+    def __setstate__(self, state):
+        (self.buckets, self.count, self.total, self.min, self.max) = state
+
+    def record(self, value):
+        """record one latency
+        Args:
+            value: latency, in cycles
+        Return:
+            None
+        """
+        idx = bucket_index(value)
+        self.buckets[idx] = self.buckets.get(idx, 0) + 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+        if self.min is None or value < self.min:
+            self.min = value
+
+    def record_array(self, values):
+        """record an array of latencies at once
+        Args:
+            values: NumPy array of non-negative latencies, in cycles
+        Return:
+            None
+        """
+        if len(values) == 0:
+            return
+
+        values = values.astype(np.int64)
+        idx = values.copy()
+        large = values >= 2 * SUB_COUNT
+        if large.any():
+            big = values[large]
+            shift = np.floor(np.log2(big)).astype(np.int64)
+            # fix up the rounding of log2 next to the powers of 2
+            shift[(big >> shift) == 0] -= 1
+            shift[(big >> (shift + 1)) != 0] += 1
+            shift -= SUB_BITS
+            idx[large] = shift * SUB_COUNT + (big >> shift)
+
+        (indexes, counts) = np.unique(idx, return_counts=True)
+        for (i, count) in zip(indexes, counts):
+            self.buckets[int(i)] = self.buckets.get(int(i), 0) + int(count)
+
+        self.count += len(values)
+        self.total += long(values.sum())
+        self.max = max(self.max, long(values.max()))
+        if self.min is None:
+            self.min = long(values.min())
+        else:
+            self.min = min(self.min, long(values.min()))
+
+    def merge(self, other):
+        """add the latencies recorded by another histogram
+        Args:
+            other: LatencyHistogram
+        Return:
+            None
+        """
+        for (idx, count) in other.buckets.items():
+            self.buckets[idx] = self.buckets.get(idx, 0) + count
+        self.count += other.count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+        if other.min is not None:
+            if self.min is None or other.min < self.min:
+                self.min = other.min
+
+    def percentile(self, pct):
+        """get a percentile of the recorded latencies
+        Args:
+            pct: percentile, in [0, 100]
+        Return:
+            highest value of the bucket the percentile falls in, capped by
+            the max latency, 0 if nothing was recorded
+        """
+        if self.count == 0:
+            return 0
+
+        rank = pct * self.count / 100.0
+        seen = 0
+        for idx in sorted(self.buckets.keys()):
+            seen += self.buckets[idx]
+            if seen >= rank:
+                return min(bucket_range(idx)[1] - 1, self.max)
+
+        return self.max
+
+    def percentiles(self):
+        """get the reported percentiles
+        Return:
+            list of (percentile, latency) for PERCENTILES
+        """
+        return [(pct, self.percentile(pct)) for pct in PERCENTILES]
+
+    def log2_histogram(self):
+        """fold the buckets into power of 2 buckets
+        Return:
+            sorted list of (lowest latency, highest latency + 1, count)
+        """
+        folded = {}
+        for (idx, count) in self.buckets.items():
+            low = bucket_range(idx)[0]
+            order = low.bit_length() - 1 if low > 0 else -1
+            folded[order] = folded.get(order, 0) + count
+
+        hist = []
+        for order in sorted(folded.keys()):
+            if order < 0:
+                hist.append((0, 1, folded[order]))
+            else:
+                hist.append((1 << order, 1 << (order + 1), folded[order]))
+
+        return hist
@@ -0,0 +1,205 @@
+#!/usr/bin/python2
+# -*- coding: UTF-8 -*-
+
+"""
+This script defines the function profiler, which rebuilds the call stacks
+of each cpu from the ENTER/EXIT events and reports the inclusive and
+exclusive cycles of the functions, and the collapsed stacks for flame
+graph tools
+"""
+
+import csv
+from array import array
+
+from analyzer import Analyzer, register_analyzer
+
+@register_analyzer
+class ProfileAnalyzer(Analyzer):
+    """function profile, on the shared pass over the trace data
+
+    Function names are interned to integer ids, and the call stacks to
+    stack ids: stack id 0 is the empty stack, stack_parent[sid] and
+    stack_func[sid] give the calling stack and the function on top. The
+    cycles are accounted by function id and by stack id, so memory only
+    grows with the number of distinct functions and call paths.
+
+    An EXIT closes the frames above the matching ENTER, whose EXIT were
+    lost; an EXIT without a matching ENTER, and the frames still open at
+    the end of the trace, are counted as unmatched.
+    """
+
+    name = 'profile'
+    per_cpu_report = True
+
+    def __init__(self, **options):
+        self.names = []
+        self.name_index = {}
+        # by function id
+        self.calls = array('L')
+        self.inclusive = array('L')
+        self.exclusive = array('L')
+        # by stack id
+        self.stack_parent = array('L', [0])
+        self.stack_func = array('L', [0])
+        self.stack_cycles = array('L', [0])
+        self.stack_index = {}
+        self.nr_unmatched = 0
+        # current call stack, one entry per frame
+        self.frames = array('L')
+        self.frame_tsc = array('L')
+        self.frame_child = array('L')
+        # number of frames of each function, to not count the inclusive
+        # cycles of recursive calls twice
+        self.active = array('L')
+
+    def _func_id(self, name):
+        fid = self.name_index.get(name)
+        if fid is None:
+            fid = len(self.names)
+            self.names.append(name)
+            self.name_index[name] = fid
+            self.calls.append(0)
+            self.inclusive.append(0)
+            self.exclusive.append(0)
+            self.active.append(0)
+        return fid
+
+    def _stack_id(self, parent, fid):
+        key = (parent, fid)
+        sid = self.stack_index.get(key)
+        if sid is None:
+            sid = len(self.stack_parent)
+            self.stack_parent.append(parent)
+            self.stack_func.append(fid)
+            self.stack_cycles.append(0)
+            self.stack_index[key] = sid
+        return sid
+
+    def begin(self, freq):
+        del self.frames[:]
+        del self.frame_tsc[:]
+        del self.frame_child[:]
+
+    def _pop(self, tsc):
+        sid = self.frames.pop()
+        cycles = tsc - self.frame_tsc.pop()
+        self_cycles = max(cycles - self.frame_child.pop(), 0)
+        fid = self.stack_func[sid]
+
+        self.calls[fid] += 1
+        self.active[fid] -= 1
+        if self.active[fid] == 0:
+            self.inclusive[fid] += cycles
+        self.exclusive[fid] += self_cycles
+        self.stack_cycles[sid] += self_cycles
+        if len(self.frame_child) != 0:
+            self.frame_child[-1] += cycles
+
+    def feed(self, events):
+        for (ev_id, tsc, info) in events:
+            if ev_id == 'ENTER':
+                fid = self._func_id(info.strip())
+                parent = self.frames[-1] if len(self.frames) != 0 else 0
+                self.frames.append(self._stack_id(parent, fid))
+                self.frame_tsc.append(tsc)
+                self.frame_child.append(0)
+                self.active[fid] += 1
+            elif ev_id == 'EXIT ':
+                fid = self.name_index.get(info.strip())
+                if fid is None or self.active[fid] == 0:
+                    self.nr_unmatched += 1
+                    continue
+                # close the frames whose EXIT was lost
+                while self.stack_func[self.frames[-1]] != fid:
+                    self.nr_unmatched += 1
+                    self._pop(tsc)
+                self._pop(tsc)
+
+    def end(self):
+        self.nr_unmatched += len(self.frames)
+        for sid in self.frames:
+            self.active[self.stack_func[sid]] -= 1
+        self.begin(None)
+
+    def valid(self):
+        return len(self.names) != 0
+
+    def merge(self, other):
+        fids = [self._func_id(name) for name in other.names]
+        for (ofid, fid) in enumerate(fids):
+            self.calls[fid] += other.calls[ofid]
+            self.inclusive[fid] += other.inclusive[ofid]
+            self.exclusive[fid] += other.exclusive[ofid]
+
+        # a stack is always created after its parent
+        sids = [0]
+        for osid in xrange(1, len(other.stack_parent)):
+            sid = self._stack_id(sids[other.stack_parent[osid]],
+                                 fids[other.stack_func[osid]])
+            self.stack_cycles[sid] += other.stack_cycles[osid]
+            sids.append(sid)
+
+        self.nr_unmatched += other.nr_unmatched
+
+    def collapsed_stacks(self):
+        """get the collapsed stacks, as read by flame graph tools
+        Return:
+            list of (stack "caller;...;callee", exclusive cycles)
+        """
+        paths = [None]
+        stacks = []
+        for sid in xrange(1, len(self.stack_parent)):
+            name = self.names[self.stack_func[sid]]
+            parent = self.stack_parent[sid]
+            if parent != 0:
+                name = paths[parent] + ';' + name
+            paths.append(name)
+            if self.stack_cycles[sid] != 0:
+                stacks.append((name, self.stack_cycles[sid]))
+
+        return stacks
+
+    def report(self, ofile, freq):
+        generate_report(ofile, freq, self)
+
+def generate_report(ofile, freq, profile):
+    """ generate function profile report
+    Args:
+        ofile: output report, saved to ofile_profile.csv, the collapsed
+               stacks to ofile_profile.folded
+        freq: CPU frequency of the device trace data from
+        profile: ProfileAnalyzer
+    Return:
+        None
+    """
+    total = sum(profile.exclusive)
+    csv_name = ofile + '_profile.csv'
+    try:
+        with open(csv_name, 'w') as filep:
+            f_csv = csv.writer(filep)
+
+            print "\nFunction \tCalls \tInclusive \tExclusive \tPercentage"
+            f_csv.writerow(['Function', 'Calls', 'Inclusive(cycles)',
+                            'Exclusive(cycles)', 'Exclusive Percentage'])
+            fids = sorted(xrange(len(profile.names)),
+                          key=lambda fid: profile.exclusive[fid], reverse=True)
+            for fid in fids:
+                pct = 0.0
+                if total != 0:
+                    pct = float(profile.exclusive[fid]) * 100 / total
+                print "%s \t%d \t%d \t%d \t%2.2f" % \
+                      (profile.names[fid], profile.calls[fid],
+                       profile.inclusive[fid], profile.exclusive[fid], pct)
+                f_csv.writerow([profile.names[fid], profile.calls[fid],
+                                profile.inclusive[fid],
+                                profile.exclusive[fid], '%2.2f' % (pct)])
+
+            print "Unmatched ENTER/EXIT \t%d" % (profile.nr_unmatched)
+            f_csv.writerow(['Unmatched', profile.nr_unmatched])
+
+        with open(ofile + '_profile.folded', 'w') as filep:
+            for (stack, cycles) in profile.collapsed_stacks():
+                filep.write("%s %d\n" % (stack, cycles))
+
+    except IOError as err:
+        print "Output File Error: " + str(err)
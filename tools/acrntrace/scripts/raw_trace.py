@@ -0,0 +1,191 @@
+#!/usr/bin/python2
+# -*- coding: UTF-8 -*-
+
+"""
+This script defines the functions to read the raw trace data file, dumped
+by "acrntrace -r", as a memory-mapped NumPy structured array
+"""
+
+import os
+import struct
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+HAVE_NUMPY = np is not None
+
+from trace_event import EVENT_NAMES, EVENT_IDS, DECODERS, \
+        decode_raw_payload, encode_payload, format_payload
+
+# "ACRNTRAW", see TRACE_RAW_MAGIC in acrntrace.h
+TRACE_RAW_MAGIC = 0x574152544e524341
+TRACE_ELEMENT_SIZE = 32
+
+# trace_raw_hdr_t and trace_ev_t, to read the file without NumPy
+RAW_HDR_STRUCT = struct.Struct('<QQdQ')
+RAW_EV_STRUCT = struct.Struct('<QQ16s')
+
+# number of records read at once by read_raw_events()
+RAW_READ_RECORDS = 4096
+
+_EV_HEADER_STRUCT = struct.Struct('<QQ')
+
+if np is not None:
+    # trace_raw_hdr_t
+    RAW_HDR_DTYPE = np.dtype([
+        ('magic', '<u8'),
+        ('cpuid', '<u8'),
+        ('freq', '<f8'),
+        ('reserved', '<u8')
+    ])
+
+    # trace_ev_t, the fields of the payload union overlap
+    TRACE_EV_DTYPE = np.dtype({
+        'names': ['tsc', 'id', 'a', 'b', 'c', 'd', 'e', 'f', 'str'],
+        'formats': ['<u8', '<u8', '<u4', '<u4', '<u4', '<u4',
+                    '<u8', '<u8', 'S16'],
+        'offsets': [0, 8, 16, 20, 24, 28, 16, 24, 16],
+        'itemsize': TRACE_ELEMENT_SIZE
+    })
+else:
+    RAW_HDR_DTYPE = None
+    TRACE_EV_DTYPE = None
+
+def encode_event(ev_id, tsc, info):
+    """encode a text trace event as a raw trace record
+    Args:
+        ev_id: event name
+        tsc: tsc of the event
+        info: payload text
+    Return:
+        32 bytes string, the trace_ev_t record, or None for an unknown
+        event or a malformed payload
+    """
+    if ev_id not in EVENT_IDS:
+        return None
+
+    try:
+        payload = encode_payload(ev_id, DECODERS[ev_id](info))
+    except ValueError:
+        return None
+
+    return _EV_HEADER_STRUCT.pack(tsc, EVENT_IDS[ev_id]) + payload
+
+def raw_header(cpuid, freq):
+    """get the header of a raw trace data file
+    Args:
+        cpuid: cpu the trace data is from
+        freq: cpu frequency
+    Return:
+        string, the trace_raw_hdr_t
+    """
+    return RAW_HDR_STRUCT.pack(TRACE_RAW_MAGIC, cpuid, freq, 0)
+
+def is_raw_trace(ifile):
+    """check if a trace data file is a raw one
+    Args:
+        ifile: input trace data file
+    Return:
+        True if the file starts with the raw trace header magic
+    """
+    try:
+        with open(ifile, 'rb') as ifp:
+            magic = ifp.read(8)
+    except IOError:
+        return False
+
+    return len(magic) == 8 and struct.unpack('<Q', magic)[0] == TRACE_RAW_MAGIC
+
+def load_raw_trace(ifile):
+    """memory-map a raw trace data file
+    Args:
+        ifile: input raw trace data file
+    Return:
+        tuple of (cpuid, cpu frequency, records), records is a read-only
+        NumPy structured array of TRACE_EV_DTYPE backed by the file
+    Raises:
+        ImportError if NumPy is not available, ValueError on a bad header
+    """
+    if np is None:
+        raise ImportError("NumPy is required to read raw trace data")
+
+    hdr = np.fromfile(ifile, dtype=RAW_HDR_DTYPE, count=1)
+    if len(hdr) != 1 or hdr['magic'][0] != TRACE_RAW_MAGIC:
+        raise ValueError("%s is not a raw trace data file" % (ifile))
+
+    # a partial record may be left at the end if acrntrace was killed
+    nr_records = (os.path.getsize(ifile) - RAW_HDR_DTYPE.itemsize) \
+                 / TRACE_ELEMENT_SIZE
+    if nr_records > 0:
+        records = np.memmap(ifile, dtype=TRACE_EV_DTYPE, mode='r',
+                            offset=RAW_HDR_DTYPE.itemsize,
+                            shape=(nr_records,))
+    else:
+        records = np.zeros(0, dtype=TRACE_EV_DTYPE)
+
+    return (int(hdr['cpuid'][0]), float(hdr['freq'][0]), records)
+
+def count_events(records):
+    """count the trace events by event id
+    Args:
+        records: trace records returned by load_raw_trace()
+    Return:
+        dict of event name to number of events
+    """
+    (ids, counts) = np.unique(records['id'], return_counts=True)
+
+    return dict((EVENT_NAMES.get(int(ev_id), '0x%x' % ev_id), int(count))
+                for (ev_id, count) in zip(ids, counts))
+
+def decode_raw_records(data):
+    """decode the trace records of a block of raw trace data
+    Args:
+        data: string of trace_ev_t records, a partial record at the end is
+              ignored
+    Return:
+        generator of (ev_id, tsc, info) tuples, the payload is formatted as
+        the text trace data
+    """
+    for offset in xrange(0, len(data) - TRACE_ELEMENT_SIZE + 1,
+                         TRACE_ELEMENT_SIZE):
+        (tsc, ev_id, payload) = RAW_EV_STRUCT.unpack_from(data, offset)
+        name = EVENT_NAMES.get(ev_id, '0x%x' % ev_id)
+        yield (name, tsc,
+               format_payload(name, decode_raw_payload(name, payload)))
+
+def read_raw_events(ifile):
+    """read the events of a raw trace data file one by one, without NumPy
+    Args:
+        ifile: input raw trace data file
+    Return:
+        generator of (ev_id, tsc, info) tuples, as read_events() of
+        vmexit_analyze yields for text trace data, the payload is formatted
+        as the text trace data
+    Raises:
+        ValueError on a bad header
+    """
+    with open(ifile, 'rb') as ifp:
+        hdr = ifp.read(RAW_HDR_STRUCT.size)
+        if (len(hdr) != RAW_HDR_STRUCT.size
+                or RAW_HDR_STRUCT.unpack(hdr)[0] != TRACE_RAW_MAGIC):
+            raise ValueError("%s is not a raw trace data file" % (ifile))
+
+        while True:
+            data = ifp.read(RAW_READ_RECORDS * TRACE_ELEMENT_SIZE)
+            # a partial record may be left at the end if acrntrace was killed
+            for event in decode_raw_records(data):
+                yield event
+            if len(data) < RAW_READ_RECORDS * TRACE_ELEMENT_SIZE:
+                break
+
+def get_raw_freq(ifile):
+    """get the cpu freq from the header of a raw trace data file
+    Args:
+        ifile: input raw trace data file
+    Return:
+        cpu frequency
+    """
+    with open(ifile, 'rb') as ifp:
+        return RAW_HDR_STRUCT.unpack(ifp.read(RAW_HDR_STRUCT.size))[2]
@@ -0,0 +1,217 @@
+#!/usr/bin/python2
+# -*- coding: UTF-8 -*-
+
+"""
+This script defines the timer analyzer, which reports the hypervisor timers
+added, picked up and timer IRQs over time, the deadline slip of the timers
+picked up and the distribution of the timer IRQ rate
+"""
+
+import csv
+
+from trace_event import DECODERS
+from latency_hist import LatencyHistogram, PERCENTILES
+from analyzer import Analyzer, register_analyzer
+
+# default size of the time buckets, in milliseconds
+TIMER_BUCKET_MS = 10
+
+LIST_TIMER_EVENTS = ['TIMER_ACTION ADDED', 'TIMER_ACTION PCKUP',
+                     'TIMER_ACTION UPDAT', 'TIMER_IRQ total']
+
+# row of a time bucket
+BUCKET_IRQS = 0
+BUCKET_ADDED = 1
+BUCKET_PCKUP = 2
+
+# bucket row column of the TIMER_ACTION events
+BUCKET_ACTIONS = {
+    'TIMER_ACTION ADDED': BUCKET_ADDED,
+    'TIMER_ACTION PCKUP': BUCKET_PCKUP
+}
+
+def fire_tsc(timer_id, deadline):
+    """get the deadline of a timer from its TIMER_ACTION event
+    Args:
+        timer_id: ID field of the event
+        deadline: deadline field of the event
+    Return:
+        fire tsc of the timer: the hypervisor traces it as the 64 bits e
+        payload field, which the ID (signed) and deadline fields print as
+        its low and high 32 bits
+    """
+    return (deadline << 32) | (timer_id & 0xffffffff)
+
+@register_analyzer
+class TimerAnalyzer(Analyzer):
+    """timer report, on the shared pass over the trace data
+
+    The deadline slip is the tsc of a TIMER_ACTION PCKUP minus the fire
+    tsc of the timer, a negative slip is counted as early. The events do
+    not tell the timer queue depth: their total field is always 0, and
+    the periodic timers are queued again, and the timers deleted, without
+    an event, so only the timers added and picked up are counted.
+    """
+
+    name = 'timer'
+    per_cpu_report = True
+
+    def __init__(self, timeline=0, **options):
+        self.bucket_ms = timeline if timeline != 0 else TIMER_BUCKET_MS
+        self.bucket = 0
+        self.nr_events = dict.fromkeys(LIST_TIMER_EVENTS, 0)
+        self.slip = LatencyHistogram()
+        self.nr_early = 0
+        self.irq_interval = LatencyHistogram()
+        # bucket index (tsc / bucket) to row
+        self.buckets = {}
+        self.tsc_irq = None
+
+    def begin(self, freq):
+        self.bucket = long(self.bucket_ms * freq * 1000)
+        self.tsc_irq = None
+
+    def _row(self, idx):
+        row = self.buckets.get(idx)
+        if row is None:
+            row = [0, 0, 0]
+            self.buckets[idx] = row
+        return row
+
+    def feed(self, events):
+        for (ev_id, tsc, info) in events:
+            if not ev_id.startswith('TIMER_'):
+                continue
+            if ev_id not in self.nr_events:
+                continue
+
+            try:
+                fields = DECODERS[ev_id](info)
+            except ValueError:
+                continue
+
+            self.nr_events[ev_id] += 1
+
+            if ev_id == 'TIMER_IRQ total':
+                self._row(tsc / self.bucket)[BUCKET_IRQS] += 1
+                if self.tsc_irq is not None:
+                    self.irq_interval.record(tsc - self.tsc_irq)
+                self.tsc_irq = tsc
+                continue
+
+            if ev_id not in BUCKET_ACTIONS:
+                continue
+            self._row(tsc / self.bucket)[BUCKET_ACTIONS[ev_id]] += 1
+
+            if ev_id == 'TIMER_ACTION PCKUP':
+                deadline = fire_tsc(fields[0], fields[1])
+                if tsc >= deadline:
+                    self.slip.record(tsc - deadline)
+                else:
+                    self.nr_early += 1
+
+    def valid(self):
+        return sum(self.nr_events.values()) != 0
+
+    def merge(self, other):
+        for event in LIST_TIMER_EVENTS:
+            self.nr_events[event] += other.nr_events[event]
+        self.slip.merge(other.slip)
+        self.nr_early += other.nr_early
+        self.irq_interval.merge(other.irq_interval)
+        for (idx, other_row) in other.buckets.items():
+            row = self._row(idx)
+            for col in xrange(len(row)):
+                row[col] += other_row[col]
+
+    def irq_rates(self):
+        """get the timer IRQ rate of every bucket
+        Return:
+            LatencyHistogram of the IRQs per second, empty buckets included
+        """
+        rates = LatencyHistogram()
+        if len(self.buckets) == 0:
+            return rates
+
+        bucket_sec = self.bucket_ms / 1000.0
+        for idx in xrange(min(self.buckets), max(self.buckets) + 1):
+            row = self.buckets.get(idx)
+            nr_irqs = row[BUCKET_IRQS] if row is not None else 0
+            rates.record(int(nr_irqs / bucket_sec))
+
+        return rates
+
+    def report(self, ofile, freq):
+        generate_report(ofile, freq, self)
+
+def write_distribution(f_csv, title, unit, hist, extra=None):
+    """write one row of percentiles of a distribution
+    Args:
+        f_csv: csv writer
+        title: name of the distribution
+        unit: unit of the values
+        hist: LatencyHistogram
+        extra: list of values appended to the row
+    Return:
+        None
+    """
+    values = [hist.count, hist.min if hist.min is not None else 0]
+    values += [value for (pct, value) in hist.percentiles()]
+    values.append(hist.max)
+    if extra is not None:
+        values += extra
+
+    print "%s (%s) \t%s" % (title, unit, " \t".join("%d" % v for v in values))
+    f_csv.writerow([title + '(%s)' % unit] + values)
+
+def generate_report(ofile, freq, timers):
+    """ generate timer report
+    Args:
+        ofile: output report, saved to ofile_timer.csv
+        freq: CPU frequency of the device trace data from
+        timers: TimerAnalyzer
+    Return:
+        None
+    """
+    csv_name = ofile + '_timer.csv'
+    try:
+        with open(csv_name, 'w') as filep:
+            f_csv = csv.writer(filep)
+
+            print "\nTimer Event \tCount"
+            f_csv.writerow(['Timer_Event', 'Count'])
+            for event in LIST_TIMER_EVENTS:
+                print "%s \t%d" % (event, timers.nr_events[event])
+                f_csv.writerow([event, timers.nr_events[event]])
+
+            f_csv.writerow([''])
+
+            print "\nDistribution \tCount \tMin \t%s \tMax" % \
+                  " \t".join("P%s" % pct for pct in PERCENTILES)
+            f_csv.writerow(['Distribution', 'Count', 'Min'] +
+                           ['P%s' % pct for pct in PERCENTILES] +
+                           ['Max', 'Early'])
+            write_distribution(f_csv, 'Deadline_Slip', 'cycles', timers.slip,
+                               [timers.nr_early])
+            write_distribution(f_csv, 'Timer_IRQ_Interval', 'cycles',
+                               timers.irq_interval)
+            write_distribution(f_csv, 'Timer_IRQ_Rate', 'IRQ/Sec',
+                               timers.irq_rates())
+
+            f_csv.writerow([''])
+
+            # timer events over time
+            f_csv.writerow(['Time(Sec)', 'NR_Timer_IRQ', 'NR_Added',
+                            'NR_Pickup'])
+            if len(timers.buckets) == 0:
+                return
+            first = min(timers.buckets)
+            for idx in xrange(first, max(timers.buckets) + 1):
+                row = timers.buckets.get(idx, [0, 0, 0])
+                f_csv.writerow(['%.6f' % ((idx - first) * timers.bucket_ms
+                                          / 1000.0),
+                                row[BUCKET_IRQS], row[BUCKET_ADDED],
+                                row[BUCKET_PCKUP]])
+
+    except IOError as err:
+        print "Output File Error: " + str(err)
@@ -0,0 +1,128 @@
+#!/usr/bin/python2
+# -*- coding: UTF-8 -*-
+
+"""
+This script defines the functions to run several analyzers on one shared
+pass over the trace data
+"""
+
+from itertools import islice
+
+import vmexit_analyze as va
+from trace_merge import file_events, file_freq
+from trace_cache import cached_path
+from analyzer import ANALYZERS
+
+# the analyzers register themselves when imported
+import hotspot_analyze
+import timer_analyze
+import profile_analyze
+import irq_analyze
+import guest_run_analyze
+
+# number of events read before they are fed to the analyzers
+FEED_BATCH = 4096
+
+def analyze_file(args):
+    """run the analyzers on one trace data file, may run in a worker process
+    Args:
+        args: tuple of (ifile, names, options), names of the analyzers and
+              their options
+    Return:
+        tuple of (cpu frequency, list of analyzers in names order)
+    """
+    (ifile, names, options) = args
+    analyzers = [ANALYZERS[name](**options) for name in names]
+
+    ifile = cached_path(ifile)
+    freq = file_freq(ifile)
+    for analyzer in analyzers:
+        analyzer.begin(freq)
+
+    try:
+        events = file_events(ifile)
+        while True:
+            batch = list(islice(events, FEED_BATCH))
+            if len(batch) == 0:
+                break
+            for analyzer in analyzers:
+                analyzer.feed(batch)
+
+    except IOError as err:
+        print "Input File Error: " + str(err)
+
+    for analyzer in analyzers:
+        analyzer.end()
+
+    return (freq, analyzers)
+
+def write_reports(ofile, freq, analyzers, source):
+    """write the report of each analyzer
+    Args:
+        ofile: output report file
+        freq: CPU frequency
+        analyzers: list of analyzers
+        source: trace data file or directory, for the error messages
+    Return:
+        None
+    """
+    for analyzer in analyzers:
+        if not analyzer.valid():
+            print "Invalid trace data for %s in %s" % (analyzer.name, source)
+            continue
+        analyzer.report(ofile, freq)
+
+def analyze_trace(ifile, ofile, names, **options):
+    """run several analyzers on one read of a trace data file
+    Args:
+        ifile: input trace data file
+        ofile: output report file
+        names: names of the registered analyzers to run
+        options: analysis options, passed to the analyzers, the file is
+                 read by this process whatever the number of jobs
+    Return:
+        None
+    """
+    print("Trace analysis started... \n\tinput file: %s\n"
+          "\toutput file: %s\n\tanalyzers: %s" %
+          (ifile, ofile, ', '.join(names)))
+
+    (freq, analyzers) = analyze_file((ifile, names, options))
+    write_reports(ofile, freq, analyzers, ifile)
+
+def analyze_trace_dir(idir, ofile, names, jobs=0, **options):
+    """run several analyzers on one read of all the cpus, in parallel
+    Args:
+        idir: input trace data directory
+        ofile: output report file
+        names: names of the registered analyzers to run
+        jobs: number of worker processes, 0 for one per host cpu
+        options: analysis options, passed to the analyzers
+    Return:
+        None
+    """
+    print("Trace analysis started... \n\tinput dir: %s\n"
+          "\toutput file: %s\n\tanalyzers: %s" %
+          (idir, ofile, ', '.join(names)))
+
+    results = va.map_trace_files(analyze_file, idir,
+                                 lambda path: (path, names, options), jobs)
+    if len(results) == 0:
+        print "No trace data file in %s" % (idir)
+        return
+
+    merged = None
+    for (cpu, path, (freq, analyzers)) in results:
+        for analyzer in analyzers:
+            if analyzer.per_cpu_report and analyzer.valid():
+                print "\n[CPU %d]" % (cpu)
+                analyzer.report("%s_cpu%d" % (ofile, cpu), freq)
+
+        if merged is None:
+            merged = analyzers
+            continue
+        for (analyzer, other) in zip(merged, analyzers):
+            analyzer.merge(other)
+
+    print "\n[All CPUs]"
+    write_reports(ofile, freq, merged, idir)
@@ -0,0 +1,155 @@
+#!/usr/bin/python2
+# -*- coding: UTF-8 -*-
+
+"""
+This script defines the parsed trace cache: the first analysis of a text
+trace data file saves its events as raw trace data in a cache directory,
+and the next ones read the raw trace data instead of parsing the text
+"""
+
+import hashlib
+import os
+import tempfile
+
+import vmexit_analyze as va
+from raw_trace import encode_event, raw_header, is_raw_trace, HAVE_NUMPY
+from trace_input import open_trace, split_member
+
+# bytes hashed at the beginning and at the end of a trace data file, with
+# its path, size and mtime, to tell a rewritten file without reading it all
+CACHE_HASH_BYTES = 1 << 20
+
+# default size of the cache directory, in MiB
+CACHE_SIZE_MB = 4096
+
+CACHE_SUFFIX = '.raw'
+
+# cache directory, None if the cache is disabled
+CACHE_DIR = None
+CACHE_MAX_BYTES = CACHE_SIZE_MB << 20
+
+def set_cache_dir(cache_dir, size_mb=CACHE_SIZE_MB):
+    """enable the parsed trace cache
+    Args:
+        cache_dir: cache directory, created if needed, None to disable
+        size_mb: size the cache directory is trimmed to, in MiB
+    Return:
+        None
+    """
+    global CACHE_DIR, CACHE_MAX_BYTES
+
+    if cache_dir is not None and not HAVE_NUMPY:
+        # raw trace data is only faster to read as NumPy arrays
+        print "NumPy is not available, the trace cache is not used"
+        cache_dir = None
+
+    if cache_dir is not None and not os.path.isdir(cache_dir):
+        os.makedirs(cache_dir)
+    CACHE_DIR = cache_dir
+    CACHE_MAX_BYTES = size_mb << 20
+
+def cache_key(ifile):
+    """get the cache key of a trace data file
+    Args:
+        ifile: text trace data file, maybe compressed or in a tarball
+    Return:
+        hex string, the sha1 of the path, size, mtime and of the first and
+        last CACHE_HASH_BYTES of the file, or of the tarball it is in
+    """
+    (path, member) = split_member(ifile)
+    stat = os.stat(path)
+    sha = hashlib.sha1()
+    sha.update("%s\0%d\0%r\0" % (os.path.abspath(ifile), stat.st_size,
+                                 stat.st_mtime))
+
+    with open(path, 'rb') as ifp:
+        sha.update(ifp.read(CACHE_HASH_BYTES))
+        if stat.st_size > 2 * CACHE_HASH_BYTES:
+            ifp.seek(-CACHE_HASH_BYTES, os.SEEK_END)
+            sha.update(ifp.read(CACHE_HASH_BYTES))
+
+    return sha.hexdigest()
+
+def convert_trace(ifile, ofp):
+    """save the events of a text trace data file as raw trace data
+    Args:
+        ifile: input text trace data file
+        ofp: output file object
+    Return:
+        None
+    """
+    name = os.path.basename(ifile)
+    cpuid = int(name) if name.isdigit() else 0
+    ofp.write(raw_header(cpuid, va.get_freq(ifile)))
+
+    with open_trace(ifile) as ifp:
+        # skip the cpu freq line
+        ifp.readline()
+        for (ev_id, tsc, info) in va.read_events(ifp):
+            record = encode_event(ev_id, tsc, info)
+            if record is not None:
+                ofp.write(record)
+
+def evict(keep):
+    """remove the least recently used entries beyond the cache size
+    Args:
+        keep: path of an entry never removed, the one in use
+    Return:
+        None
+    """
+    entries = []
+    for name in os.listdir(CACHE_DIR):
+        if not name.endswith(CACHE_SUFFIX):
+            continue
+        path = os.path.join(CACHE_DIR, name)
+        try:
+            stat = os.stat(path)
+        except OSError:
+            # removed by another process
+            continue
+        entries.append((stat.st_mtime, stat.st_size, path))
+
+    total = sum(size for (mtime, size, path) in entries)
+    for (mtime, size, path) in sorted(entries):
+        if total <= CACHE_MAX_BYTES:
+            break
+        if path == keep:
+            continue
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        total -= size
+
+def cached_path(ifile):
+    """get the trace data file to read in place of a text one
+    Args:
+        ifile: input trace data file
+    Return:
+        path of the raw trace data cached for ifile, created if missing,
+        or ifile if the cache is disabled or ifile is raw trace data
+    """
+    if CACHE_DIR is None or is_raw_trace(ifile):
+        return ifile
+
+    path = os.path.join(CACHE_DIR, cache_key(ifile) + CACHE_SUFFIX)
+    if os.path.isfile(path):
+        # the mtime of the entries tells the least recently used ones
+        os.utime(path, None)
+        return path
+
+    # write to a temporary file first, a parallel run may read the cache
+    (fd, tmp_path) = tempfile.mkstemp(suffix='.tmp', dir=CACHE_DIR)
+    try:
+        with os.fdopen(fd, 'wb') as ofp:
+            convert_trace(ifile, ofp)
+        os.rename(tmp_path, path)
+    except (IOError, OSError) as err:
+        print "Trace cache error: " + str(err)
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        return ifile
+
+    evict(path)
+
+    return path
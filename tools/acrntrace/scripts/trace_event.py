@@ -0,0 +1,308 @@
+#!/usr/bin/python2
+# -*- coding: UTF-8 -*-
+
+"""
+This script defines the trace events, it mirrors trace_event.h
+"""
+
+import re
+import struct
+
+# TIMER
+TRACE_TIMER_ACTION_ADDED = 0x1
+TRACE_TIMER_ACTION_PCKUP = 0x2
+TRACE_TIMER_ACTION_UPDAT = 0x3
+TRACE_TIMER_IRQ = 0x4
+
+TRACE_VM_EXIT = 0x10
+TRACE_VM_ENTER = 0x11
+TRC_VMEXIT_ENTRY = 0x10000
+
+TRC_VMEXIT_EXCEPTION_OR_NMI = TRC_VMEXIT_ENTRY + 0x00000000
+TRC_VMEXIT_EXTERNAL_INTERRUPT = TRC_VMEXIT_ENTRY + 0x00000001
+TRC_VMEXIT_INTERRUPT_WINDOW = TRC_VMEXIT_ENTRY + 0x00000002
+TRC_VMEXIT_CPUID = TRC_VMEXIT_ENTRY + 0x00000004
+TRC_VMEXIT_RDTSC = TRC_VMEXIT_ENTRY + 0x00000010
+TRC_VMEXIT_VMCALL = TRC_VMEXIT_ENTRY + 0x00000012
+TRC_VMEXIT_CR_ACCESS = TRC_VMEXIT_ENTRY + 0x0000001C
+TRC_VMEXIT_IO_INSTRUCTION = TRC_VMEXIT_ENTRY + 0x0000001E
+TRC_VMEXIT_RDMSR = TRC_VMEXIT_ENTRY + 0x0000001F
+TRC_VMEXIT_WRMSR = TRC_VMEXIT_ENTRY + 0x00000020
+TRC_VMEXIT_EPT_VIOLATION = TRC_VMEXIT_ENTRY + 0x00000030
+TRC_VMEXIT_EPT_MISCONFIGURATION = TRC_VMEXIT_ENTRY + 0x00000031
+TRC_VMEXIT_RDTSCP = TRC_VMEXIT_ENTRY + 0x00000033
+TRC_VMEXIT_APICV_WRITE = TRC_VMEXIT_ENTRY + 0x00000038
+TRC_VMEXIT_APICV_ACCESS = TRC_VMEXIT_ENTRY + 0x00000039
+TRC_VMEXIT_APICV_VIRT_EOI = TRC_VMEXIT_ENTRY + 0x0000003A
+
+TRC_VMEXIT_UNHANDLED = 0x20000
+
+TRACE_CUSTOM = 0xFC
+TRACE_FUNC_ENTER = 0xFD
+TRACE_FUNC_EXIT = 0xFE
+TRACE_STR = 0xFF
+
+# event names, as printed before the ':' in the text trace data
+EVENT_NAMES = {
+    TRACE_TIMER_ACTION_ADDED: 'TIMER_ACTION ADDED',
+    TRACE_TIMER_ACTION_PCKUP: 'TIMER_ACTION PCKUP',
+    TRACE_TIMER_ACTION_UPDAT: 'TIMER_ACTION UPDAT',
+    TRACE_TIMER_IRQ: 'TIMER_IRQ total',
+    TRACE_CUSTOM: 'CUSTOM',
+    TRACE_FUNC_ENTER: 'ENTER',
+    TRACE_FUNC_EXIT: 'EXIT ',
+    TRACE_STR: 'STR',
+    TRACE_VM_EXIT: 'VM_EXIT',
+    TRACE_VM_ENTER: 'VM_ENTER',
+    TRC_VMEXIT_EXCEPTION_OR_NMI: 'VMEXIT_EXCEPTION_OR_NMI',
+    TRC_VMEXIT_EXTERNAL_INTERRUPT: 'VMEXIT_EXTERNAL_INTERRUPT',
+    TRC_VMEXIT_INTERRUPT_WINDOW: 'VMEXIT_INTERRUPT_WINDOW',
+    TRC_VMEXIT_CPUID: 'VMEXIT_CPUID',
+    TRC_VMEXIT_RDTSC: 'VMEXIT_RDTSC',
+    TRC_VMEXIT_VMCALL: 'VMEXIT_VMCALL',
+    TRC_VMEXIT_CR_ACCESS: 'VMEXIT_CR_ACCESS',
+    TRC_VMEXIT_IO_INSTRUCTION: 'VMEXIT_IO_INSTRUCTION',
+    TRC_VMEXIT_RDMSR: 'VMEXIT_RDMSR',
+    TRC_VMEXIT_WRMSR: 'VMEXIT_WRMSR',
+    TRC_VMEXIT_EPT_VIOLATION: 'VMEXIT_EPT_VIOLATION',
+    TRC_VMEXIT_EPT_MISCONFIGURATION: 'VMEXIT_EPT_MISCONFIGURATION',
+    TRC_VMEXIT_RDTSCP: 'VMEXIT_RDTSCP',
+    TRC_VMEXIT_APICV_WRITE: 'VMEXIT_APICV_WRITE',
+    TRC_VMEXIT_APICV_ACCESS: 'VMEXIT_APICV_ACCESS',
+    TRC_VMEXIT_APICV_VIRT_EOI: 'VMEXIT_APICV_VIRT_EOI',
+    TRC_VMEXIT_UNHANDLED: 'VMEXIT_UNHANDLED'
+}
+
+EVENT_IDS = dict((name, ev_id) for (ev_id, name) in EVENT_NAMES.items())
+
+def _hex(value):
+    return int(value, 16)
+
+def _cr_op(value):
+    return 1 if value == 'Read' else 0
+
+# payload of each event, as printed by its *_FMT in trace_event.h:
+# (style, [(field name, conversion, trace_ev_t payload field), ...])
+# named: "name value, name value ...", positional: "value value ...",
+# string: the whole payload is one string; the payload field 'cb' holds
+# a 64 bits value split into c (high 32 bits) and b (low 32 bits)
+EVENT_FORMATS = {
+    'TIMER_ACTION ADDED': ('named', [('ID', int, 'a'),
+                                     ('deadline', _hex, 'cb'),
+                                     ('total', int, 'd')]),
+    'TIMER_ACTION PCKUP': ('named', [('ID', int, 'a'),
+                                     ('deadline', _hex, 'cb'),
+                                     ('total', int, 'd')]),
+    'TIMER_ACTION UPDAT': ('named', [('ID', int, 'a'),
+                                     ('deadline', _hex, 'cb'),
+                                     ('total', int, 'd')]),
+    'TIMER_IRQ total': ('positional', [('total', _hex, 'e')]),
+    'CUSTOM': ('positional', [('e', _hex, 'e'), ('f', _hex, 'f')]),
+    'ENTER': ('string', [('func', str, 'str')]),
+    'EXIT ': ('string', [('func', str, 'str')]),
+    'STR': ('string', [('str', str, 'str')]),
+    'VM_EXIT': ('named', [('exit_reason', _hex, 'e'),
+                          ('guest_rip', _hex, 'f')]),
+    'VM_ENTER': ('named', []),
+    'VMEXIT_EXCEPTION_OR_NMI': ('named', [('vec', _hex, 'a'),
+                                          ('err_code', _hex, 'b'),
+                                          ('type', int, 'c')]),
+    'VMEXIT_EXTERNAL_INTERRUPT': ('named', [('vec', _hex, 'e')]),
+    'VMEXIT_INTERRUPT_WINDOW': ('named', []),
+    'VMEXIT_CPUID': ('named', [('vcpuid', int, 'e')]),
+    'VMEXIT_RDTSC': ('named', [('host_tsc', _hex, 'e'),
+                               ('tsc_offset', _hex, 'f')]),
+    'VMEXIT_VMCALL': ('named', [('vmid', int, 'e'),
+                                ('hypercall_id', int, 'f')]),
+    'VMEXIT_CR_ACCESS': ('named', [('op', _cr_op, 'e'),
+                                   ('rn_nr', int, 'f')]),
+    'VMEXIT_IO_INSTRUCTION': ('named', [('port', int, 'a'),
+                                        ('dir', int, 'b'),
+                                        ('sz', int, 'c'),
+                                        ('cur_ctx_idx', int, 'd')]),
+    'VMEXIT_RDMSR': ('named', [('msr', _hex, 'e'), ('val', _hex, 'f')]),
+    'VMEXIT_WRMSR': ('named', [('msr', _hex, 'e'), ('val', _hex, 'f')]),
+    'VMEXIT_EPT_VIOLATION': ('named', [('qual', _hex, 'e'),
+                                       ('gpa', _hex, 'f')]),
+    'VMEXIT_EPT_MISCONFIGURATION': ('named', []),
+    'VMEXIT_RDTSCP': ('named', [('guest_tsc', _hex, 'e'),
+                                ('tsc_aux', _hex, 'f')]),
+    'VMEXIT_APICV_WRITE': ('named', [('offset', _hex, 'e')]),
+    'VMEXIT_APICV_ACCESS': ('named', []),
+    'VMEXIT_APICV_VIRT_EOI': ('named', [('vec', _hex, 'e')]),
+    'VMEXIT_UNHANDLED': ('positional', [('exit_reason', _hex, 'e')])
+}
+
+# value of a payload field, up to the ',' or the blank following it
+_VALUE_PATTERN = r'([^,\s]+)'
+
+def _named_decoder(fields):
+    pattern = re.compile(r'\s*' + r',?\s+'.join(
+        '%s %s' % (re.escape(field), _VALUE_PATTERN)
+        for (field, conv, slot) in fields))
+    convs = [conv for (field, conv, slot) in fields]
+
+    def decode(info):
+        match = pattern.match(info)
+        if match is None:
+            raise ValueError("malformed payload: %s" % (info.strip()))
+        values = match.groups()
+        return tuple([conv(value) for (conv, value) in zip(convs, values)])
+    return decode
+
+def _positional_decoder(fields):
+    convs = [conv for (field, conv, slot) in fields]
+
+    def decode(info):
+        values = info.split()
+        return tuple([conv(value) for (conv, value) in zip(convs, values)])
+    return decode
+
+def _string_decoder(fields):
+    def decode(info):
+        return (info.strip(),)
+    return decode
+
+_DECODER_FACTORIES = {
+    'named': _named_decoder,
+    'positional': _positional_decoder,
+    'string': _string_decoder
+}
+
+# payload decoder of each event, returning the tuple of the field values,
+# the payload patterns are compiled once here
+DECODERS = dict(
+    (name, _DECODER_FACTORIES[style](fields))
+    for (name, (style, fields)) in EVENT_FORMATS.items())
+
+# payload field names of each event
+EVENT_FIELDS = dict(
+    (name, tuple(field for (field, conv, slot) in fields))
+    for (name, (style, fields)) in EVENT_FORMATS.items())
+
+def field_decoder(ev_id, field):
+    """get a decoder of a single payload field, cheaper than DECODERS[ev_id]
+    when only one field is needed
+    Args:
+        ev_id: event name, with a named style payload
+        field: field name
+    Return:
+        function taking the payload text and returning the field value
+    """
+    conv = [c for (f, c, slot) in EVENT_FORMATS[ev_id][1] if f == field][0]
+    match = re.compile(r'.*?\b%s %s' % (re.escape(field), _VALUE_PATTERN)).match
+
+    def decode(info):
+        value = match(info)
+        if value is None:
+            raise ValueError("malformed payload: %s" % (info.strip()))
+        return conv(value.group(1))
+    return decode
+
+# number of interrupt and exception vectors
+NR_VECTORS = 256
+
+# vector decoder of the events carrying an interrupt or exception vector
+VECTOR_DECODERS = dict(
+    (name, field_decoder(name, 'vec'))
+    for name in ['VMEXIT_EXCEPTION_OR_NMI', 'VMEXIT_EXTERNAL_INTERRUPT',
+                 'VMEXIT_APICV_VIRT_EOI'])
+
+def decode_payload(ev_id, info):
+    """decode the payload of a text trace event
+    Args:
+        ev_id: event name
+        info: payload text, what follows the ':'
+    Return:
+        dict of field name to value, empty for an unknown event
+    Raises:
+        ValueError on a malformed payload
+    """
+    if ev_id not in DECODERS:
+        return {}
+
+    return dict(zip(EVENT_FIELDS[ev_id], DECODERS[ev_id](info)))
+
+# trace_ev_t payload field of each payload value of each event
+EVENT_SLOTS = dict(
+    (name, tuple(slot for (field, conv, slot) in fields))
+    for (name, (style, fields)) in EVENT_FORMATS.items())
+
+_ABCD_STRUCT = struct.Struct('<IIII')
+_EF_STRUCT = struct.Struct('<QQ')
+_SLOT_INDEX = {'a': 0, 'b': 1, 'c': 2, 'd': 3, 'e': 4, 'f': 5}
+
+def encode_payload(ev_id, values):
+    """encode payload values the way the trace_ev_t payload union holds them
+    Args:
+        ev_id: event name
+        values: tuple of the field values, as returned by DECODERS[ev_id]
+    Return:
+        16 bytes string
+    """
+    payload = [0, 0, 0, 0, 0, 0]
+
+    for (slot, value) in zip(EVENT_SLOTS.get(ev_id, ()), values):
+        if slot == 'str':
+            return struct.pack('16s', value)
+        elif slot == 'cb':
+            payload[2] = value >> 32
+            payload[1] = value & 0xffffffff
+        elif slot in ('a', 'b', 'c', 'd'):
+            # a 32 bits field printed with %d may be negative
+            payload[_SLOT_INDEX[slot]] = value & 0xffffffff
+        else:
+            payload[_SLOT_INDEX[slot]] = value
+
+    if payload[4] == 0 and payload[5] == 0:
+        return _ABCD_STRUCT.pack(*payload[:4])
+
+    # e and f overlap a, b, c and d
+    return _EF_STRUCT.pack(payload[4], payload[5])
+
+_VALUE_FORMATS = {
+    _hex: lambda value: '0x%016x' % value,
+    int: lambda value: '%d' % value,
+    str: lambda value: value,
+    _cr_op: lambda value: 'Read' if value else 'Write'
+}
+
+def decode_raw_payload(ev_id, payload):
+    """decode the payload of a raw trace event, the reverse of
+    encode_payload()
+    Args:
+        ev_id: event name
+        payload: 16 bytes string, the trace_ev_t payload union
+    Return:
+        tuple of the field values, as returned by DECODERS[ev_id]
+    """
+    slots = EVENT_SLOTS.get(ev_id, ())
+    if slots == ('str',):
+        return (payload.split('\0', 1)[0],)
+
+    (a, b, c, d) = _ABCD_STRUCT.unpack(payload)
+    (e, f) = _EF_STRUCT.unpack(payload)
+    values = {'a': a, 'b': b, 'c': c, 'd': d, 'e': e, 'f': f,
+              'cb': (c << 32) | b}
+
+    return tuple([values[slot] for slot in slots])
+
+def format_payload(ev_id, values):
+    """format payload values as the text trace data, for DECODERS[ev_id]
+    Args:
+        ev_id: event name
+        values: tuple of the field values
+    Return:
+        payload text, what follows the ':'
+    """
+    if ev_id not in EVENT_FORMATS:
+        return ''
+
+    (style, fields) = EVENT_FORMATS[ev_id]
+    texts = [_VALUE_FORMATS[conv](value)
+             for ((field, conv, slot), value) in zip(fields, values)]
+    if style == 'named':
+        return ' ' + ', '.join('%s %s' % (field, text) for
+                               ((field, conv, slot), text) in zip(fields, texts))
+
+    return ' ' + ' '.join(texts)
@@ -0,0 +1,204 @@
+#!/usr/bin/python2
+# -*- coding: UTF-8 -*-
+
+"""
+This script defines the functions to analyze the vm_exits live, while
+acrntrace is still appending to the trace data files, text or raw
+"""
+
+import os
+import struct
+import time
+from collections import deque
+
+import vmexit_analyze as va
+from raw_trace import RAW_HDR_STRUCT, TRACE_ELEMENT_SIZE, TRACE_RAW_MAGIC, \
+        decode_raw_records
+
+# max bytes read from one trace data file per refresh, so a large backlog
+# does not delay the refresh of the other files
+FOLLOW_READ_SIZE = 16 << 20
+
+class TraceTail(object):
+    """a trace data file being written, text or raw, read incrementally"""
+
+    def __init__(self, cpuid, path):
+        self.cpuid = cpuid
+        self.path = path
+        self.offset = 0
+        self.partial = ''
+        # None until the file is long enough to tell
+        self.raw = None
+        self.freq = None
+        self.analysis = None
+        self.stats = None
+
+    def read_data(self):
+        """read the data appended since the last call
+        Return:
+            string of the data left over by the last call followed by the
+            new data
+        """
+        try:
+            with open(self.path, 'rb') as ifp:
+                ifp.seek(self.offset)
+                data = ifp.read(FOLLOW_READ_SIZE)
+        except IOError:
+            return self.partial
+
+        self.offset += len(data)
+        return self.partial + data
+
+    def read_lines(self, data):
+        """split text trace data into lines
+        Args:
+            data: string returned by read_data()
+        Return:
+            list of complete lines, the cpu freq line is consumed
+        """
+        lines = data.split('\n')
+        # keep the line acrntrace is still writing for the next call
+        self.partial = lines.pop()
+
+        if self.freq is None and len(lines) > 0:
+            self.freq = float(lines.pop(0)[10:])
+
+        return lines
+
+    def read_records(self, data):
+        """decode raw trace data
+        Args:
+            data: string returned by read_data()
+        Return:
+            list of (ev_id, tsc, info) of the complete records, the header
+            is consumed
+        """
+        if self.freq is None:
+            if len(data) < RAW_HDR_STRUCT.size:
+                self.partial = data
+                return []
+            self.freq = RAW_HDR_STRUCT.unpack_from(data)[2]
+            data = data[RAW_HDR_STRUCT.size:]
+
+        # keep the record acrntrace is still writing for the next call
+        end = len(data) - len(data) % TRACE_ELEMENT_SIZE
+        self.partial = data[end:]
+
+        return list(decode_raw_records(data[:end]))
+
+    def update(self):
+        """account the events appended since the last call
+        Return:
+            True if any new data was read
+        """
+        data = self.read_data()
+        if self.raw is None:
+            # the magic of the raw header tells the format apart
+            if len(data) < 8:
+                self.partial = data
+                return False
+            self.raw = struct.unpack('<Q', data[:8])[0] == TRACE_RAW_MAGIC
+
+        if self.raw:
+            events = self.read_records(data)
+        else:
+            events = list(va.read_events(self.read_lines(data)))
+        if len(events) == 0:
+            return False
+
+        if self.analysis is None:
+            self.analysis = va.VmExitAnalysis()
+        self.analysis.feed(events)
+        self.stats = self.analysis.to_dict()
+
+        return True
+
+def print_rates(stats, freq, snapshots):
+    """print the exit rates over the sliding window
+    Args:
+        stats: current merged counters
+        freq: CPU frequency
+        snapshots: deque of (tsc, nr_exits, total_nr_exits), the oldest one
+                   opens the window
+    Return:
+        None
+    """
+    (tsc_then, exits_then, total_then) = snapshots[0]
+    window_sec = float(stats['tsc_end'] - tsc_then) / (freq * 1000 * 1000)
+
+    print "\n[%s] window %.2f (Sec), run time %.2f (Sec)" % \
+          (time.strftime("%H:%M:%S"), window_sec,
+           float(stats['run_cycles']) / (freq * 1000 * 1000))
+    print "Event \tNR_Exit \tNR_Exit/Sec"
+
+    for event in va.LIST_EVENTS:
+        if stats['nr_exits'][event] == 0:
+            continue
+
+        rate = 0.0
+        if window_sec > 0:
+            rate = (stats['nr_exits'][event] - exits_then[event]) / window_sec
+        print "%s \t%d \t%.2f" % (event, stats['nr_exits'][event], rate)
+
+    rate = 0.0
+    if window_sec > 0:
+        rate = (stats['total_nr_exits'] - total_then) / window_sec
+    print "Total \t%d \t%.2f" % (stats['total_nr_exits'], rate)
+
+def follow_vm_exit(ipath, ofile, interval=1, window=10):
+    """do the vm exits analysis live, until interrupted by ctrl-c
+    Args:
+        ipath: input trace data file or directory
+        ofile: output report file, written when interrupted
+        interval: seconds between two refreshes of the rates
+        window: seconds of trace time the rates are computed over
+    Return:
+        None
+    """
+    if os.path.isdir(ipath):
+        tails = [TraceTail(cpu, path)
+                 for (cpu, path) in va.list_trace_files(ipath)]
+    else:
+        tails = [TraceTail(0, ipath)]
+
+    print("VM exits live analysis started... \n\tinput: %s (%d files)\n"
+          "\toutput file: %s.csv, ctrl-c to stop" %
+          (ipath, len(tails), ofile))
+
+    snapshots = deque()
+    stats = None
+    freq = None
+
+    try:
+        while True:
+            for tail in tails:
+                tail.update()
+
+            stats_list = [tail.stats for tail in tails
+                          if tail.stats is not None
+                          and tail.stats['tsc_begin'] != 0]
+            if len(stats_list) == 0:
+                time.sleep(interval)
+                continue
+
+            freq = [tail.freq for tail in tails if tail.freq is not None][0]
+            stats = va.merge_stats(stats_list)
+
+            snapshots.append((stats['tsc_end'], dict(stats['nr_exits']),
+                              stats['total_nr_exits']))
+            window_start = stats['tsc_end'] - window * freq * 1000 * 1000
+            while len(snapshots) > 1 and snapshots[1][0] <= window_start:
+                snapshots.popleft()
+
+            print_rates(stats, freq, snapshots)
+            time.sleep(interval)
+
+    except KeyboardInterrupt:
+        pass
+
+    if stats is None or stats['run_cycles'] == 0:
+        print "No complete vm_exit in %s" % (ipath)
+        return
+
+    print "\n[Final]"
+    va.generate_report(ofile, freq, stats)
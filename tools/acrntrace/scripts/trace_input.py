@@ -0,0 +1,424 @@
+#!/usr/bin/python2
+# -*- coding: UTF-8 -*-
+
+"""
+This script defines the functions to read compressed text trace data, and
+the per-cpu trace data files of a tarball of an acrntrace directory,
+without decompressing them to disk: the data is inflated by a decompressor
+process while it is parsed, and a tarball is read once as a stream, its
+files one after the other. A tarball can also be extracted once to a
+temporary directory, to parse its files in parallel
+"""
+
+import atexit
+import os
+import shutil
+import subprocess
+import tarfile
+import tempfile
+
+# suffix of the compressed files to the command writing the data to stdout
+DECOMPRESSORS = [
+    ('.gz', ['gzip', '-dc']),
+    ('.xz', ['xz', '-dc']),
+    ('.zst', ['zstd', '-dc'])
+]
+
+# short suffix of the compressed tarballs to the compression suffix
+ARCHIVE_SHORT_SUFFIXES = [('.tgz', '.gz'), ('.txz', '.xz'), ('.tzst', '.zst')]
+
+ARCHIVE_SUFFIXES = ['.tar'] + \
+                   [short for (short, suffix) in ARCHIVE_SHORT_SUFFIXES] + \
+                   ['.tar' + suffix for (suffix, cmd) in DECOMPRESSORS]
+
+# size of the pipe buffer between the decompressor and the parser
+PIPE_BUFFER = 1 << 20
+
+# extract the tarballs to a temporary directory, instead of reading them
+# once as a stream
+EXTRACT_ARCHIVES = False
+
+# tarball path to the temporary directory it is extracted to, inherited by
+# the worker processes
+_EXTRACTED = {}
+
+# member path to the StreamMember of the member of a tarball being read
+_STREAMED = {}
+
+def set_extract_archives(extract):
+    """choose how to read the tarballs of trace data directories
+    Args:
+        extract: True to extract them to a temporary directory, so their
+                 files are parsed in parallel, False to read them once as
+                 a stream, without writing them to disk
+    Return:
+        None
+    """
+    global EXTRACT_ARCHIVES
+
+    EXTRACT_ARCHIVES = extract
+
+def is_streamed(path):
+    """check if a trace data directory is read once as a stream
+    Args:
+        path: trace data directory or tarball of one
+    Return:
+        True for a tarball not to be extracted, its files are then read
+        one after the other by stream_archive()
+    """
+    return is_archive(path) and not EXTRACT_ARCHIVES
+
+def is_archive(path):
+    """check if a path is a tarball, maybe compressed
+    Args:
+        path: file path
+    Return:
+        True if the path has a tarball suffix
+    """
+    return any(path.endswith(suffix) for suffix in ARCHIVE_SUFFIXES)
+
+def is_trace_dir(path):
+    """check if a path holds per-cpu trace data files
+    Args:
+        path: trace data directory or tarball of one
+    Return:
+        True for a directory or a tarball
+    """
+    return os.path.isdir(path) or (is_archive(path) and os.path.isfile(path))
+
+def split_member(path):
+    """split the path of a file of a tarball
+    Args:
+        path: file path, or tarball path followed by the member name
+    Return:
+        tuple of (tarball path, member name), or (path, None) if path is
+        not in a tarball
+    """
+    pos = path.find(os.sep)
+    while pos != -1:
+        if is_archive(path[:pos]) and os.path.isfile(path[:pos]):
+            return (path[:pos], path[pos + 1:])
+        pos = path.find(os.sep, pos + 1)
+
+    return (path, None)
+
+def decompressor(path):
+    """get the command decompressing a file
+    Args:
+        path: file path
+    Return:
+        list of the command and its options, None if not compressed
+    """
+    for (suffix, cmd) in DECOMPRESSORS:
+        if path.endswith(suffix):
+            return cmd
+
+    return None
+
+def is_compressed(path):
+    """check if a trace data file is to be read through a decompressor
+    Args:
+        path: trace data file, maybe in a tarball
+    Return:
+        True if the file is compressed or in a tarball not extracted, it
+        can then only be read sequentially
+    """
+    (archive, member) = split_member(path)
+    if member is not None:
+        return archive not in _EXTRACTED and not EXTRACT_ARCHIVES
+
+    return decompressor(path) is not None
+
+def extract_archive(archive):
+    """extract a tarball to a temporary directory, once per run
+    Args:
+        archive: tarball, maybe compressed
+    Return:
+        path of the directory, removed when the process exits
+    Raises:
+        IOError if tar fails
+    """
+    root = _EXTRACTED.get(archive)
+    if root is not None:
+        return root
+
+    root = tempfile.mkdtemp(prefix='acrnalyze-')
+    atexit.register(shutil.rmtree, root, True)
+    try:
+        # tar detects the compression, the archive is inflated once
+        subprocess.check_call(['tar', '-xf', archive, '-C', root])
+    except (OSError, subprocess.CalledProcessError) as err:
+        raise IOError("Failed to extract %s: %s" % (archive, err))
+
+    _EXTRACTED[archive] = root
+    return root
+
+def archive_decompressor(archive):
+    """get the command decompressing a tarball
+    Args:
+        archive: tarball path
+    Return:
+        list of the command and its options, None if not compressed
+    """
+    for (short, suffix) in ARCHIVE_SHORT_SUFFIXES:
+        if archive.endswith(short):
+            return decompressor(suffix)
+
+    return decompressor(archive)
+
+def archive_members(archive):
+    """list the per-cpu trace data files of a tarball
+    Args:
+        archive: tarball of an acrntrace directory, maybe compressed
+    Return:
+        list of (cpuid, member path) sorted by cpuid, the member path is
+        the tarball path followed by the member name; open_trace() reads
+        it from the tarball extracted if EXTRACT_ARCHIVES, with a tar
+        process of its own otherwise
+    """
+    if EXTRACT_ARCHIVES:
+        root = extract_archive(archive)
+        names = []
+        for (dirpath, dirnames, filenames) in os.walk(root):
+            names += [os.path.relpath(os.path.join(dirpath, base), root)
+                      for base in filenames]
+    else:
+        try:
+            names = subprocess.check_output(['tar', '-tf',
+                                             archive]).splitlines()
+        except (OSError, subprocess.CalledProcessError) as err:
+            raise IOError("Failed to list %s: %s" % (archive, err))
+
+    files = []
+    for name in names:
+        base = os.path.basename(name)
+        if base.isdigit():
+            files.append((int(base), os.path.join(archive, name)))
+
+    return sorted(files)
+
+class StreamMember(object):
+    """a per-cpu trace data file of a tarball read as a stream
+
+    The data can only be read once; the first line, the cpu freq, is kept
+    so that it can be read on its own before the data is parsed.
+    """
+
+    def __init__(self, path, fileobj):
+        self.path = path
+        self.fileobj = fileobj
+        self.header = None
+        self.consumed = False
+
+    def open(self):
+        """get a file object reading the member from its beginning
+        Return:
+            StreamReader
+        Raises:
+            IOError if the data after the first line was already read
+        """
+        if self.consumed:
+            raise IOError("%s was already read, the files of a tarball "
+                          "can only be read once" % (self.path))
+        if self.header is None:
+            self.header = self.fileobj.readline()
+
+        return StreamReader(self)
+
+class StreamReader(object):
+    """read a StreamMember as a file"""
+
+    def __init__(self, member):
+        self.member = member
+        self.header = member.header
+
+    def readline(self):
+        if self.header:
+            (line, self.header) = (self.header, '')
+            return line
+        return self._read(self.member.fileobj.readline)
+
+    def read(self, size=-1):
+        if self.header:
+            (data, self.header) = (self.header, '')
+            if size < 0:
+                return data + self.read()
+            return data
+        return self._read(self.member.fileobj.read, size)
+
+    def _read(self, func, *args):
+        self.member.consumed = True
+        try:
+            return func(*args)
+        except tarfile.TarError as err:
+            raise IOError("Failed to read %s: %s" % (self.member.path, err))
+
+    def __iter__(self):
+        while True:
+            line = self.readline()
+            if line == '':
+                return
+            yield line
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def stream_archive(archive):
+    """read the per-cpu trace data files of a tarball in a single pass
+    Args:
+        archive: tarball of an acrntrace directory, maybe compressed
+    Return:
+        generator of (cpuid, member path), in the order of the tarball;
+        until the next one is generated, open_trace() reads the member
+        from the stream
+    Raises:
+        IOError if the tarball cannot be read
+    """
+    cmd = archive_decompressor(archive)
+    if cmd is not None:
+        if not os.path.isfile(archive):
+            raise IOError("No such file: %s" % (archive))
+        ifp = PipeFile(cmd + [archive], archive)
+    else:
+        ifp = open(archive, 'rb')
+
+    try:
+        tar = tarfile.open(fileobj=ifp, mode='r|')
+        for info in tar:
+            base = os.path.basename(info.name)
+            if not info.isfile() or not base.isdigit():
+                continue
+            path = os.path.join(archive, info.name)
+            _STREAMED[path] = StreamMember(path, tar.extractfile(info))
+            try:
+                yield (int(base), path)
+            finally:
+                del _STREAMED[path]
+
+    except tarfile.TarError as err:
+        raise IOError("Failed to read %s: %s" % (archive, err))
+
+    finally:
+        ifp.close()
+
+class PipeFile(object):
+    """read the output of a decompressor process as a file
+
+    The process inflates the data in parallel with the parsing of the data
+    already read; closing the file before the end of the data stops it.
+    Reaching the end of the data, or closing the file after the process
+    exited, raises IOError if it failed, e.g. on a truncated file.
+    """
+
+    def __init__(self, cmd, path):
+        try:
+            self.proc = subprocess.Popen(cmd, stdout=subprocess.PIPE,
+                                         bufsize=PIPE_BUFFER)
+        except OSError as err:
+            raise IOError("Failed to run %s to read %s: %s" %
+                          (cmd[0], path, err))
+        self.stdout = self.proc.stdout
+        self.cmd = cmd[0]
+        self.path = path
+        self.checked = False
+
+    def readline(self):
+        line = self.stdout.readline()
+        if line == '':
+            self.check()
+        return line
+
+    def read(self, size=-1):
+        data = self.stdout.read(size)
+        if size < 0 or (data == '' and size != 0):
+            self.check()
+        return data
+
+    def __iter__(self):
+        for line in self.stdout:
+            yield line
+        self.check()
+
+    def check(self):
+        """wait for the end of the process at the end of the data
+        Return:
+            None
+        Raises:
+            IOError if the process failed
+        """
+        if self.checked:
+            return
+        self.checked = True
+        if self.proc.wait() != 0:
+            raise IOError("%s failed to read %s, exit status %d" %
+                          (self.cmd, self.path, self.proc.returncode))
+
+    def close(self):
+        # the exit status of a process stopped here does not matter
+        if self.proc.poll() is None:
+            self.proc.kill()
+            self.checked = True
+        self.stdout.close()
+        self.check()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def local_path(path):
+    """get the path of a trace data file on disk
+    Args:
+        path: trace data file, maybe in a tarball
+    Return:
+        path of the file a tarball member is extracted to, the tarball is
+        extracted first if EXTRACT_ARCHIVES, path itself otherwise
+    """
+    (archive, member) = split_member(path)
+    if member is None:
+        return path
+
+    root = _EXTRACTED.get(archive)
+    if root is None and EXTRACT_ARCHIVES:
+        root = extract_archive(archive)
+    if root is None:
+        return path
+
+    return os.path.join(root, member)
+
+def open_trace(path):
+    """open a trace data file for reading, decompressing it on the fly
+    Args:
+        path: trace data file, compressed or not, or tarball path followed
+              by the member name
+    Return:
+        file object, to be closed by the caller
+    Raises:
+        IOError if the file or the decompressor is missing
+    """
+    if path in _STREAMED:
+        return _STREAMED[path].open()
+
+    (archive, member) = split_member(path)
+    if member is not None:
+        if archive in _EXTRACTED or EXTRACT_ARCHIVES:
+            return open(local_path(path), 'rb')
+        # a member given alone is not worth extracting the whole tarball:
+        # tar detects the compression, and stops at the first match
+        return PipeFile(['tar', '-xOf', archive, '--occurrence=1', member],
+                        path)
+
+    cmd = decompressor(path)
+    if cmd is not None:
+        if not os.path.isfile(path):
+            raise IOError("No such file: %s" % (path))
+        return PipeFile(cmd + [path], path)
+
+    return open(path, 'rb')
@@ -0,0 +1,224 @@
+#!/usr/bin/python2
+# -*- coding: UTF-8 -*-
+
+"""
+This script defines the functions to merge the events of the per-cpu trace
+data files in global TSC order, and to export the merged events to the
+Chrome trace event format, read by chrome://tracing and Perfetto
+"""
+
+import heapq
+import json
+
+import vmexit_analyze as va
+from raw_trace import is_raw_trace, read_raw_events, get_raw_freq
+from trace_event import decode_payload
+from trace_input import open_trace, is_trace_dir
+from trace_cache import cached_path
+
+def file_events(ifile):
+    """read the events of a text or raw trace data file
+    Args:
+        ifile: trace data file, as returned by cached_path()
+    Return:
+        generator of (ev_id, tsc, info) tuples
+    """
+    if is_raw_trace(ifile):
+        for event in read_raw_events(ifile):
+            yield event
+        return
+
+    with open_trace(ifile) as ifp:
+        # skip the cpu freq line
+        ifp.readline()
+        for event in va.read_events(ifp):
+            yield event
+
+def file_freq(ifile):
+    """get the cpu freq of a text or raw trace data file
+    Args:
+        ifile: trace data file, as returned by cached_path()
+    Return:
+        cpu frequency
+    """
+    if is_raw_trace(ifile):
+        return get_raw_freq(ifile)
+
+    return va.get_freq(ifile)
+
+def merge_events(files):
+    """merge the events of several trace data files in TSC order
+
+    One event per file is held in a heap, so memory does not grow with the
+    trace. Events of the same file keep their order, even if their TSC
+    goes backwards; events of several files with the same TSC come in cpu
+    order.
+
+    Args:
+        files: list of (cpuid, trace data file as returned by cached_path())
+    Return:
+        generator of (tsc, cpuid, ev_id, info) tuples
+    """
+    heap = []
+    for (cpu, path) in files:
+        events = file_events(path)
+        for event in events:
+            heap.append((event[1], cpu, event, events))
+            break
+    heapq.heapify(heap)
+
+    while len(heap) != 0:
+        (tsc, cpu, event, events) = heap[0]
+        yield (tsc, cpu, event[0], event[2])
+
+        for event in events:
+            heapq.heapreplace(heap, (event[1], cpu, event, events))
+            break
+        else:
+            heapq.heappop(heap)
+
+def chrome_args(ev_id, info):
+    """get the payload of an event as Chrome trace event args
+    Args:
+        ev_id: event name
+        info: payload text
+    Return:
+        dict of field name to value, the integers in hexadecimal
+    """
+    try:
+        fields = decode_payload(ev_id, info)
+    except ValueError:
+        return {'payload': info.strip()}
+
+    return dict((field, '0x%x' % value if isinstance(value, (int, long))
+                 else value) for (field, value) in fields.items())
+
+class ChromeTraceWriter(object):
+    """write the merged events as a JSON array of Chrome trace events
+
+    The exits are complete events from VM_EXIT to VM_ENTER, named by their
+    exit reason; the ENTER/EXIT events are begin/end events of the function;
+    the other events are instant events. Every cpu is a thread of process 0.
+    """
+
+    def __init__(self, filep, freq, tsc_begin):
+        self.filep = filep
+        self.freq = freq
+        self.tsc_begin = tsc_begin
+        self.nr_events = 0
+        # cpuid to (tsc of the exit, name, args) of the exit in progress
+        self.exits = {}
+        # cpuid to tsc of the last VM_ENTER
+        self.enters = {}
+
+    def timestamp(self, tsc):
+        """convert a tsc to microseconds since the first event"""
+        return float(tsc - self.tsc_begin) / self.freq
+
+    def write(self, event):
+        """write one Chrome trace event
+        Args:
+            event: dict of the Chrome trace event
+        Return:
+            None
+        """
+        self.filep.write(",\n" if self.nr_events != 0 else "[\n")
+        self.filep.write(json.dumps(event, sort_keys=True))
+        self.nr_events += 1
+
+    def add(self, tsc, cpu, ev_id, info):
+        """convert one merged event
+        Args:
+            tsc, cpu, ev_id, info: merged event, as merge_events() yields
+        Return:
+            None
+        """
+        if ev_id == 'VM_ENTER':
+            exit_ = self.exits.pop(cpu, None)
+            if exit_ is not None:
+                (tsc_exit, name, args) = exit_
+                self.write({'name': name, 'cat': 'vm_exit', 'ph': 'X',
+                            'pid': 0, 'tid': cpu,
+                            'ts': self.timestamp(tsc_exit),
+                            'dur': self.timestamp(tsc) -
+                                   self.timestamp(tsc_exit),
+                            'args': args})
+            self.enters[cpu] = tsc
+        elif ev_id == 'VM_EXIT':
+            self.exits[cpu] = (tsc, ev_id, chrome_args(ev_id, info))
+        elif ev_id.startswith('VMEXIT_'):
+            if cpu not in self.exits:
+                # VM_EXIT lost, the exit starts at the previous VM_ENTER
+                if cpu not in self.enters:
+                    return
+                self.exits[cpu] = (self.enters[cpu], ev_id, {})
+            (tsc_exit, name, args) = self.exits[cpu]
+            args.update(chrome_args(ev_id, info))
+            self.exits[cpu] = (tsc_exit, ev_id, args)
+        elif ev_id in ('ENTER', 'EXIT '):
+            self.write({'name': info.strip(), 'cat': 'function',
+                        'ph': 'B' if ev_id == 'ENTER' else 'E',
+                        'pid': 0, 'tid': cpu, 'ts': self.timestamp(tsc)})
+        else:
+            self.write({'name': ev_id.strip(), 'cat': 'event', 'ph': 'i',
+                        's': 't', 'pid': 0, 'tid': cpu,
+                        'ts': self.timestamp(tsc),
+                        'args': chrome_args(ev_id, info)})
+
+    def close(self, cpus):
+        """write the names of the cpus and close the JSON array
+        Args:
+            cpus: list of cpuid
+        Return:
+            None
+        """
+        self.write({'name': 'process_name', 'ph': 'M', 'pid': 0,
+                    'args': {'name': 'ACRN hypervisor'}})
+        for cpu in cpus:
+            self.write({'name': 'thread_name', 'ph': 'M', 'pid': 0,
+                        'tid': cpu, 'args': {'name': 'CPU %d' % cpu}})
+        self.filep.write("\n]\n")
+
+def export_chrome_trace(ipath, ofile, **options):
+    """export the events of all the cpus in TSC order to a Chrome trace
+    Args:
+        ipath: input trace data file, directory or tarball of a directory
+        ofile: output file, the trace is saved to ofile.trace.json
+        options: other analysis options, not used here
+    Return:
+        None
+    """
+    if is_trace_dir(ipath):
+        files = va.list_trace_files(ipath)
+    else:
+        files = [(0, ipath)]
+    files = [(cpu, cached_path(path)) for (cpu, path) in files]
+
+    if len(files) == 0:
+        print "No trace data file in %s" % (ipath)
+        return
+
+    json_name = ofile + '.trace.json'
+    print("Chrome trace export started... \n\tinput: %s (%d files)\n"
+          "\toutput file: %s" % (ipath, len(files), json_name))
+
+    events = merge_events(files)
+    try:
+        with open(json_name, 'w') as filep:
+            writer = None
+            for (tsc, cpu, ev_id, info) in events:
+                if writer is None:
+                    writer = ChromeTraceWriter(filep, file_freq(files[0][1]),
+                                               tsc)
+                writer.add(tsc, cpu, ev_id, info)
+
+            if writer is None:
+                print "No trace event in %s" % (ipath)
+                return
+            writer.close([cpu for (cpu, path) in files])
+
+    except IOError as err:
+        print "Output File Error: " + str(err)
+        return
+
+    print "%d trace events exported" % (writer.nr_events)
@@ -6,10 +6,19 @@ This script defines the function to do the vm_exit analysis
 """
 
 import csv
-
-TSC_BEGIN = 0L
-TSC_END = 0L
-TOTAL_NR_EXITS = 0L
+import json
+import os
+from array import array
+from multiprocessing import Pool, cpu_count
+from raw_trace import is_raw_trace, read_raw_events, get_raw_freq, \
+        HAVE_NUMPY
+from latency_hist import LatencyHistogram, PERCENTILES
+from trace_event import field_decoder, NR_VECTORS, VECTOR_DECODERS
+from trace_input import open_trace, is_archive, is_compressed, \
+        archive_members, is_streamed, stream_archive, local_path
+from analyzer import Analyzer, register_analyzer
+# trace_cache imports this module, its functions are looked up when called
+import trace_cache
 
 LIST_EVENTS = [
     'VMEXIT_EXCEPTION_OR_NMI',
@@ -29,146 +38,346 @@ LIST_EVENTS = [
     'VMEXIT_EPT_MISCONFIGURATION',
     'VMEXIT_RDTSCP',
     'VMEXIT_APICV_WRITE',
-    'VMEXIT_UNHANDLED'
+    'VMEXIT_UNHANDLED',
+    # an exit without VMEXIT_* event, e.g. XSETBV or TPR below threshold
+    'VMEXIT_UNKNOWN'
 ]
 
-NR_EXITS = {
-    'VM_EXIT': 0,
-    'VM_ENTER': 0,
-    'VMEXIT_EXCEPTION_OR_NMI': 0,
-    'VMEXIT_EXTERNAL_INTERRUPT': 0,
-    'VMEXIT_INTERRUPT_WINDOW': 0,
-    'VMEXIT_CPUID': 0,
-    'VMEXIT_RDTSC': 0,
-    'VMEXIT_VMCALL': 0,
-    'VMEXIT_CR_ACCESS': 0,
-    'VMEXIT_IO_INSTRUCTION': 0,
-    'VMEXIT_RDMSR': 0,
-    'VMEXIT_WRMSR': 0,
-    'VMEXIT_APICV_ACCESS': 0,
-    'VMEXIT_APICV_VIRT_EOI': 0,
-    'VMEXIT_EPT_VIOLATION': 0,
-    'VMEXIT_EPT_VIOLATION_GVT': 0,
-    'VMEXIT_EPT_MISCONFIGURATION': 0,
-    'VMEXIT_RDTSCP': 0,
-    'VMEXIT_APICV_WRITE': 0,
-    'VMEXIT_UNHANDLED': 0
-}
-
-TIME_IN_EXIT = {
-    'VM_EXIT': 0,
-    'VM_ENTER': 0,
-    'VMEXIT_EXCEPTION_OR_NMI': 0,
-    'VMEXIT_EXTERNAL_INTERRUPT': 0,
-    'VMEXIT_INTERRUPT_WINDOW': 0,
-    'VMEXIT_CPUID': 0,
-    'VMEXIT_RDTSC': 0,
-    'VMEXIT_VMCALL': 0,
-    'VMEXIT_CR_ACCESS': 0,
-    'VMEXIT_IO_INSTRUCTION': 0,
-    'VMEXIT_RDMSR': 0,
-    'VMEXIT_WRMSR': 0,
-    'VMEXIT_APICV_ACCESS': 0,
-    'VMEXIT_APICV_VIRT_EOI': 0,
-    'VMEXIT_EPT_VIOLATION': 0,
-    'VMEXIT_EPT_VIOLATION_GVT': 0,
-    'VMEXIT_EPT_MISCONFIGURATION': 0,
-    'VMEXIT_RDTSCP': 0,
-    'VMEXIT_APICV_WRITE': 0,
-    'VMEXIT_UNHANDLED': 0
-}
-
-IRQ_EXITS = {}
-
-def count_irq(info):
-    vec = info[5:15]
-    if IRQ_EXITS.has_key(vec):
-        IRQ_EXITS[vec] += 1
-    else:
-        IRQ_EXITS[vec] = 1
+# index of the exit reasons in LIST_EVENTS
+REASON_INDEX = dict((event, idx) for (idx, event) in enumerate(LIST_EVENTS))
+UNKNOWN_INDEX = REASON_INDEX['VMEXIT_UNKNOWN']
+
+# a trace data file parsed in parallel is split into CHUNKS_PER_JOB chunks
+# per worker for load balancing, unless the chunks get smaller than
+# CHUNK_MIN_SIZE bytes
+CHUNKS_PER_JOB = 4
+CHUNK_MIN_SIZE = 1 << 20
 
-def parse_trace_data(ifile):
-    """parse the trace data file
+decode_ept_qual = field_decoder('VMEXIT_EPT_VIOLATION', 'qual')
+
+def is_gvt_violation(info):
+    """check if an EPT violation is a GVT one
     Args:
-        ifile: input trace data file
+        info: payload of the VMEXIT_EPT_VIOLATION event
     Return:
-        None
+        True if the page is readable and executable but not writable,
+        bits 5:3 of the exit qualification, False if not or if the payload
+        is malformed
     """
-    global TSC_BEGIN, TSC_END, TOTAL_NR_EXITS
-    tsc_enter = 0L
-    tsc_exit = 0L
-    tsc_last_exit_period = 0L
-
-    ev_id = ''
-    last_ev_id = ''
+    try:
+        return (decode_ept_qual(info) & 0x38) == 0x28
+    except ValueError:
+        return False
 
+def parse_line(line):
+    """split one line of trace data into its fields
+    Args:
+        line: a line of trace data, "cpuid | tsc | ev_id:info"
+    Return:
+        tuple of (ev_id, tsc, info), or None if the line is malformed
+    """
     try:
-        ifp = open(ifile)
+        (cpuid, tsc, payload) = line.split(" | ")
 
-        line = ifp.readline()
+        (ev_id, info) = payload.split(":", 1)
 
-        # should preprocess to make sure first event is VM_ENTER
-        while 1:
-            line = ifp.readline()
-            if line == '':
-                ifp.close()
-                break
+    except ValueError, execp:
+        print execp
+        print line
+        return None
+
+    return (ev_id, long(tsc), info)
+
+def read_events(ifp):
+    """read the trace events from an opened trace data file
+    Args:
+        ifp: trace data file object positioned after the cpu freq line,
+             or any iterable of trace data lines
+    Return:
+        generator of (ev_id, tsc, info) tuples
+    """
+    for line in ifp:
+        event = parse_line(line)
+        if event is not None:
+            yield event
+
+class VmExitAnalysis(object):
+    """vm_exit counters of a trace, or of several traces merged
+
+    The events are fed in trace order, in as many batches as wanted. Only
+    the events between the first and the last VM_ENTER are accounted, the
+    events after the latest VM_ENTER are buffered until the next one shows
+    up, so the trace data never has to be trimmed beforehand. The counters
+    are indexed by exit reason (REASON_INDEX) and by vector; they are
+    exported as the dict of to_dict(), which the reports take, or as JSON.
+    """
 
-            try:
-                (cpuid, tsc, payload) = line.split(" | ")
-
-                (ev_id, info) = payload.split(":")
-
-            except ValueError, execp:
-                print execp
-                print line
-                continue
-
-            if ev_id == 'VM_ENTER':
-                if TSC_BEGIN == 0:
-                    TSC_BEGIN = long(tsc)
-                    tsc_exit = long(tsc)
-                    TOTAL_NR_EXITS = 0
-
-                tsc_enter = long(tsc)
-                TSC_END = tsc_enter
-                tsc_last_exit_period = tsc_enter - tsc_exit
-                if tsc_last_exit_period != 0:
-                    TIME_IN_EXIT[last_ev_id] += tsc_last_exit_period
-            elif ev_id == 'VM_EXIT':
-                tsc_exit = long(tsc)
-                TSC_END = tsc_exit
-                TOTAL_NR_EXITS += 1
+    __slots__ = ['tsc_begin', 'tsc_end', 'run_cycles', 'total_nr_exits',
+                 'nr_exits', 'time_in_exit', 'irq_exits', 'latency',
+                 'timeline_bucket', 'timeline', 'keep_head', 'head',
+                 'pending']
+
+    def __init__(self, timeline_bucket=0, keep_head=False):
+        """create empty counters
+        Args:
+            timeline_bucket: bucket size in cycles of the exits timeline,
+                             0 for no timeline
+            keep_head: keep the events up to the first VM_ENTER, to stitch
+                       the chunks of a file, they are dropped otherwise
+        """
+        self.tsc_begin = 0L
+        self.tsc_end = 0L
+        # cycles from the first to the last VM_ENTER, summed over the
+        # traces merged
+        self.run_cycles = 0L
+        self.total_nr_exits = 0L
+        self.nr_exits = [0] * len(LIST_EVENTS)
+        self.time_in_exit = [0] * len(LIST_EVENTS)
+        # number of exits by exception or interrupt vector
+        self.irq_exits = array('L', [0]) * NR_VECTORS
+        # latency distribution of the exits
+        self.latency = [LatencyHistogram() for event in LIST_EVENTS]
+        # exits over time: bucket index (tsc / timeline_bucket) to an array
+        # of the number of exits by reason followed by the cycles in exit by
+        # reason, the exits are bucketed by the tsc they start at
+        self.timeline_bucket = timeline_bucket
+        self.timeline = {}
+        # the events up to and including the first VM_ENTER if keep_head,
+        # and the events after the last VM_ENTER
+        self.keep_head = keep_head
+        self.head = []
+        self.pending = []
+
+    def __getstate__(self):
+        return tuple(getattr(self, name) for name in self.__slots__)
+
+    def __setstate__(self, state):
+        for (name, value) in zip(self.__slots__, state):
+            setattr(self, name, value)
+
+    def _count_timeline(self, reason, tsc, cycles):
+        """account one exit in the timeline"""
+        idx = tsc / self.timeline_bucket
+        row = self.timeline.get(idx)
+        if row is None:
+            row = array('L', [0]) * (2 * len(LIST_EVENTS))
+            self.timeline[idx] = row
+
+        row[reason] += 1
+        row[len(LIST_EVENTS) + reason] += cycles
+
+    def _count_irq(self, ev_id, info):
+        """count the exit of an exception or interrupt vector"""
+        try:
+            vec = VECTOR_DECODERS[ev_id](info)
+        except ValueError:
+            return
+
+        if vec < NR_VECTORS:
+            self.irq_exits[vec] += 1
+
+    def _commit(self, events, tsc_enter):
+        """account the events of one exit, i.e. the events between two
+        VM_ENTER
+        Args:
+            events: list of (ev_id, tsc, info) following the previous
+                    VM_ENTER
+            tsc_enter: tsc of the VM_ENTER closing the exit
+        Return:
+            None
+        """
+        tsc_exit = None
+        reason = -1
+
+        for (ev_id, tsc, info) in events:
+            if ev_id == 'VM_EXIT':
+                tsc_exit = tsc
+                self.total_nr_exits += 1
             elif ev_id.startswith('VMEXIT_'):
-                if (ev_id == 'VMEXIT_EPT_VIOLATION'
-                        and (eval(info[6:24]) & 0x38) == 0x28):
+                if ev_id == 'VMEXIT_EPT_VIOLATION' and is_gvt_violation(info):
                     ev_id = 'VMEXIT_EPT_VIOLATION_GVT'
 
                 if ev_id.startswith('VMEXIT_EX'):
-                    count_irq(info)
+                    self._count_irq(ev_id, info)
 
-                NR_EXITS[ev_id] += 1
-                last_ev_id = ev_id
+                reason = REASON_INDEX[ev_id]
+                self.nr_exits[reason] += 1
             else:
                 # skip the non-VMEXIT trace event
                 pass
 
+        if tsc_exit is None:
+            # the VM_EXIT is lost, the exit starts at the previous VM_ENTER
+            tsc_exit = self.tsc_end
+        elif reason == -1:
+            reason = UNKNOWN_INDEX
+            self.nr_exits[reason] += 1
+
+        self.run_cycles += tsc_enter - self.tsc_end
+        self.tsc_end = tsc_enter
+        if reason != -1:
+            self.time_in_exit[reason] += tsc_enter - tsc_exit
+            self.latency[reason].record(tsc_enter - tsc_exit)
+            if self.timeline_bucket != 0:
+                self._count_timeline(reason, tsc_exit, tsc_enter - tsc_exit)
+
+    def feed(self, events):
+        """account a batch of trace events
+        Args:
+            events: iterable of (ev_id, tsc, info) tuples, following the
+                    events of the previous batch
+        Return:
+            None
+        """
+        pending = self.pending
+
+        for event in events:
+            if event[0] == 'VM_ENTER':
+                if self.tsc_begin == 0:
+                    if self.keep_head:
+                        self.head.append(event)
+                    self.tsc_begin = event[1]
+                    self.tsc_end = event[1]
+                else:
+                    self._commit(pending, event[1])
+                pending = []
+            elif self.tsc_begin == 0:
+                if self.keep_head:
+                    self.head.append(event)
+            else:
+                pending.append(event)
+
+        self.pending = pending
+
+    def merge(self, other):
+        """add the counters of another trace, e.g. of another cpu
+        Args:
+            other: VmExitAnalysis, tsc_begin/tsc_end then span both traces
+                   while run_cycles is the sum of their run time
+        Return:
+            None
+        """
+        if other.tsc_begin != 0:
+            if self.tsc_begin == 0 or other.tsc_begin < self.tsc_begin:
+                self.tsc_begin = other.tsc_begin
+        self.tsc_end = max(self.tsc_end, other.tsc_end)
+        self.run_cycles += other.run_cycles
+        self.total_nr_exits += other.total_nr_exits
+
+        for idx in xrange(len(LIST_EVENTS)):
+            self.nr_exits[idx] += other.nr_exits[idx]
+            self.time_in_exit[idx] += other.time_in_exit[idx]
+            self.latency[idx].merge(other.latency[idx])
+        for vec in xrange(NR_VECTORS):
+            self.irq_exits[vec] += other.irq_exits[vec]
+
+        if self.timeline_bucket == 0:
+            self.timeline_bucket = other.timeline_bucket
+        for (idx, row) in other.timeline.items():
+            merged_row = self.timeline.get(idx)
+            if merged_row is None:
+                self.timeline[idx] = array('L', row)
+            else:
+                for i in xrange(len(row)):
+                    merged_row[i] += row[i]
+
+    def to_dict(self):
+        """take a snapshot of the counters
+        Return:
+            dict of the counters, keyed by exit reason and by vector
+            formatted as 0x%08x, which can be pickled and merged
+        """
+        return {
+            'tsc_begin': self.tsc_begin,
+            'tsc_end': self.tsc_end,
+            'run_cycles': self.run_cycles,
+            'total_nr_exits': self.total_nr_exits,
+            'nr_exits': dict(zip(LIST_EVENTS, self.nr_exits)),
+            'time_in_exit': dict(zip(LIST_EVENTS, self.time_in_exit)),
+            'irq_exits': dict(('0x%08x' % vec, count) for (vec, count)
+                              in enumerate(self.irq_exits) if count != 0),
+            'latency': dict(zip(LIST_EVENTS, self.latency)),
+            'timeline_bucket': self.timeline_bucket,
+            'timeline': dict(self.timeline)
+        }
+
+    @classmethod
+    def from_dict(cls, stats):
+        """restore the counters from a snapshot, e.g. to continue parsing
+        Args:
+            stats: dict returned by to_dict()
+        Return:
+            VmExitAnalysis
+        """
+        analysis = cls(stats['timeline_bucket'])
+        analysis.tsc_begin = stats['tsc_begin']
+        analysis.tsc_end = stats['tsc_end']
+        analysis.run_cycles = stats['run_cycles']
+        analysis.total_nr_exits = stats['total_nr_exits']
+        analysis.nr_exits = [stats['nr_exits'][event] for event in LIST_EVENTS]
+        analysis.time_in_exit = [stats['time_in_exit'][event]
+                                 for event in LIST_EVENTS]
+        for (vec, count) in stats['irq_exits'].items():
+            analysis.irq_exits[int(vec, 16)] = count
+        analysis.latency = [stats['latency'][event] for event in LIST_EVENTS]
+        analysis.timeline = dict(stats['timeline'])
+
+        return analysis
+
+    def to_json(self, freq):
+        """export the counters as the JSON report
+        Args:
+            freq: CPU frequency of the device trace data from
+        Return:
+            JSON string, as saved by generate_json_report()
+        """
+        return json.dumps(json_report(freq, self.to_dict()), indent=2,
+                          sort_keys=True)
+
+def parse_trace_data(ifile, analysis):
+    """parse the trace data file in a single pass
+    Args:
+        ifile: input trace data file
+        analysis: VmExitAnalysis the events are fed to
+    Return:
+        None
+    """
+    try:
+        with open_trace(ifile) as ifp:
+            # skip the cpu freq line
+            ifp.readline()
+            analysis.feed(read_events(ifp))
+
     except IOError as err:
         print "Input File Error: " + str(err)
 
-    finally:
-        if 'ifp' in locals():
-            ifp.close()
+def merge_stats(stats_list):
+    """merge the vm_exit counters of several traces, e.g. one per cpu
+    Args:
+        stats_list: list of dicts returned by VmExitAnalysis.to_dict()
+    Return:
+        dict of the merged counters, run_cycles is the sum of the run time
+        of all the traces while tsc_begin/tsc_end span all of them
+    """
+    merged = VmExitAnalysis()
+    for stats in stats_list:
+        merged.merge(VmExitAnalysis.from_dict(stats))
+
+    return merged.to_dict()
 
-def generate_report(ofile, freq):
+def generate_report(ofile, freq, stats):
     """ generate analysis report
     Args:
         ofile: output report
         freq: CPU frequency of the device trace data from
+        stats: counters to report, as VmExitAnalysis.to_dict() returns
     Return:
         None
     """
-    global TSC_BEGIN, TSC_END, TOTAL_NR_EXITS
+    nr_exits = stats['nr_exits']
+    time_in_exit = stats['time_in_exit']
+    irq_exits = stats['irq_exits']
+    latency = stats['latency']
 
     csv_name = ofile + '.csv'
     try:
@@ -176,15 +385,17 @@ def generate_report(ofile, freq):
             f_csv = csv.writer(filep)
 
             total_exit_time = 0L
-            rt_cycle = TSC_END - TSC_BEGIN
+            rt_cycle = stats['tsc_end'] - stats['tsc_begin']
             assert rt_cycle != 0, "total_run_time in cycle is 0,\
                                 tsc_end %d, tsc_begin %d"\
-                                % (TSC_END, TSC_BEGIN)
+                                % (stats['tsc_end'], stats['tsc_begin'])
 
             rt_sec = float(rt_cycle) / (float(freq) * 1000 * 1000)
+            # time percentage is against the cycles of all the cpus traced
+            cpu_cycle = stats['run_cycles']
 
             for event in LIST_EVENTS:
-                total_exit_time += TIME_IN_EXIT[event]
+                total_exit_time += time_in_exit[event]
 
             print "Total run time: %d (cycles)" % (rt_cycle)
             print "CPU Freq: %f MHz)" % (freq)
@@ -203,21 +414,21 @@ def generate_report(ofile, freq):
                             'Time Percentage'])
 
             for event in LIST_EVENTS:
-                ev_freq = float(NR_EXITS[event]) / rt_sec
-                pct = float(TIME_IN_EXIT[event]) * 100 / float(rt_cycle)
+                ev_freq = float(nr_exits[event]) / rt_sec
+                pct = float(time_in_exit[event]) * 100 / float(cpu_cycle)
 
                 print ("%s \t%d \t%.2f \t%d \t%2.2f" %
-                       (event, NR_EXITS[event], ev_freq, TIME_IN_EXIT[event], pct))
-                row = [event, NR_EXITS[event], '%.2f' % ev_freq, TIME_IN_EXIT[event],
+                       (event, nr_exits[event], ev_freq, time_in_exit[event], pct))
+                row = [event, nr_exits[event], '%.2f' % ev_freq, time_in_exit[event],
                        '%2.2f' % (pct)]
                 f_csv.writerow(row)
 
-            ev_freq = float(TOTAL_NR_EXITS) / rt_sec
-            pct = float(total_exit_time) * 100 / float(rt_cycle)
+            ev_freq = float(stats['total_nr_exits']) / rt_sec
+            pct = float(total_exit_time) * 100 / float(cpu_cycle)
             print("Total \t%d \t%.2f \t%d \t%2.2f"
-                  % (TOTAL_NR_EXITS, ev_freq, total_exit_time, pct))
-            row = ["Total", TOTAL_NR_EXITS, '%.2f' % ev_freq, total_exit_time,
-                   '%2.2f' % (pct)]
+                  % (stats['total_nr_exits'], ev_freq, total_exit_time, pct))
+            row = ["Total", stats['total_nr_exits'], '%.2f' % ev_freq,
+                   total_exit_time, '%2.2f' % (pct)]
             f_csv.writerow(row)
 
             # insert a empty row to separate two tables
@@ -225,10 +436,134 @@ def generate_report(ofile, freq):
 
             print "\nVector \t\tCount \tNR_Exit/Sec"
             f_csv.writerow(['Vector', 'NR_Exit', 'NR_Exit/Sec'])
-            for e in IRQ_EXITS.keys():
-                pct = float(IRQ_EXITS[e]) / rt_sec
-                print "%s \t %d \t%.2f" % (e,IRQ_EXITS[e], pct)
-                f_csv.writerow([e, IRQ_EXITS[e], '%.2f' % pct])
+            for e in sorted(irq_exits.keys()):
+                pct = float(irq_exits[e]) / rt_sec
+                print "%s \t %d \t%.2f" % (e, irq_exits[e], pct)
+                f_csv.writerow([e, irq_exits[e], '%.2f' % pct])
+
+            f_csv.writerow([''])
+
+            print "\nEvent \t%s \tMax (cycles)" % \
+                  " \t".join("P%s" % pct for pct in PERCENTILES)
+            f_csv.writerow(['Exit_Reason'] +
+                           ['P%s(cycles)' % pct for pct in PERCENTILES] +
+                           ['Max(cycles)'])
+            for event in LIST_EVENTS:
+                hist = latency[event]
+                values = [value for (pct, value) in hist.percentiles()]
+                values.append(hist.max)
+                if hist.count != 0:
+                    print "%s \t%s" % \
+                          (event, " \t".join("%d" % v for v in values))
+                f_csv.writerow([event] + values)
+
+            f_csv.writerow([''])
+
+            f_csv.writerow(['Exit_Reason', 'Latency_From(cycles)',
+                            'Latency_To(cycles)', 'NR_Exit'])
+            for event in LIST_EVENTS:
+                for (low, high, count) in latency[event].log2_histogram():
+                    f_csv.writerow([event, low, high, count])
+
+    except IOError as err:
+        print "Output File Error: " + str(err)
+
+    generate_json_report(ofile, freq, stats)
+
+def json_report(freq, stats):
+    """ build the analysis report saved in JSON
+    Args:
+        freq: CPU frequency of the device trace data from
+        stats: counters to report
+    Return:
+        dict of the report, which json can serialize
+    """
+    rt_cycle = stats['tsc_end'] - stats['tsc_begin']
+    rt_sec = float(rt_cycle) / (float(freq) * 1000 * 1000)
+
+    exits = {}
+    for event in LIST_EVENTS:
+        hist = stats['latency'][event]
+        latency = {
+            'count': hist.count,
+            'min': hist.min if hist.min is not None else 0,
+            'max': hist.max,
+            'mean': float(hist.total) / hist.count if hist.count else 0.0,
+            'histogram': hist.log2_histogram()
+        }
+        for (pct, value) in hist.percentiles():
+            latency['p%s' % pct] = value
+
+        exits[event] = {
+            'nr_exit': stats['nr_exits'][event],
+            'nr_exit_per_sec': stats['nr_exits'][event] / rt_sec,
+            'time_cycles': stats['time_in_exit'][event],
+            'time_pct': float(stats['time_in_exit'][event]) * 100
+                        / float(stats['run_cycles']),
+            'latency': latency
+        }
+
+    report = {
+        'freq_mhz': freq,
+        'run_cycles': rt_cycle,
+        'run_sec': rt_sec,
+        'total_nr_exits': stats['total_nr_exits'],
+        'exits': exits,
+        'irq_exits': stats['irq_exits']
+    }
+
+    return report
+
+def generate_json_report(ofile, freq, stats):
+    """ generate analysis report in JSON
+    Args:
+        ofile: output report, saved to ofile.json
+        freq: CPU frequency of the device trace data from
+        stats: counters to report
+    Return:
+        None
+    """
+    json_name = ofile + '.json'
+    try:
+        with open(json_name, 'w') as filep:
+            json.dump(json_report(freq, stats), filep, indent=2,
+                      sort_keys=True)
+
+    except IOError as err:
+        print "Output File Error: " + str(err)
+
+def generate_timeline_report(ofile, freq, stats):
+    """ generate the exits timeline report, one row per time bucket
+    Args:
+        ofile: output report, saved to ofile_timeline.csv
+        freq: CPU frequency of the device trace data from
+        stats: counters to report, with the timeline enabled
+    Return:
+        None
+    """
+    timeline = stats['timeline']
+    bucket = stats['timeline_bucket']
+    nr_events = len(LIST_EVENTS)
+    if len(timeline) == 0:
+        return
+
+    csv_name = ofile + '_timeline.csv'
+    try:
+        with open(csv_name, 'w') as filep:
+            f_csv = csv.writer(filep)
+
+            f_csv.writerow(['Time(Sec)', 'NR_Exit', 'Time Consumed(cycles)'] +
+                           LIST_EVENTS +
+                           ['%s(cycles)' % event for event in LIST_EVENTS])
+
+            empty = array('L', [0]) * (2 * nr_events)
+            for idx in xrange(min(timeline.keys()), max(timeline.keys()) + 1):
+                row = timeline.get(idx, empty)
+                sec = float(idx * bucket - stats['tsc_begin']) \
+                      / (float(freq) * 1000 * 1000)
+                f_csv.writerow(['%.6f' % max(sec, 0.0),
+                                sum(row[:nr_events]), sum(row[nr_events:])] +
+                               row.tolist())
 
     except IOError as err:
         print "Output File Error: " + str(err)
@@ -241,7 +576,7 @@ def get_freq(ifile):
         cpu frequency
     """
     try:
-        ifp = open(ifile)
+        ifp = open_trace(ifile)
         line = ifp.readline()
         freq = float(line[10:])
 
@@ -255,11 +590,120 @@ def get_freq(ifile):
 
     return freq
 
-def analyze_vm_exit(ifile, ofile):
+def split_trace_file(ifile, nr_chunks):
+    """split a trace data file into byte ranges aligned to line boundaries
+    Args:
+        ifile: input trace data file
+        nr_chunks: number of chunks wanted
+    Return:
+        list of (start, end) offsets, the cpu freq line is left out
+    """
+    ifile = local_path(ifile)
+    size = os.path.getsize(ifile)
+
+    with open(ifile, 'rb') as ifp:
+        ifp.readline()
+        start = ifp.tell()
+        chunk_size = max((size - start) / nr_chunks, CHUNK_MIN_SIZE)
+
+        bounds = [start]
+        while bounds[-1] + chunk_size < size:
+            ifp.seek(bounds[-1] + chunk_size)
+            # move to the beginning of the next line
+            ifp.readline()
+            if ifp.tell() >= size:
+                break
+            bounds.append(ifp.tell())
+        bounds.append(size)
+
+    return zip(bounds[:-1], bounds[1:])
+
+def parse_trace_chunk(chunk):
+    """parse a byte range of a trace data file, run in a worker process
+    Args:
+        chunk: tuple of (ifile, start, end, timeline bucket in cycles)
+    Return:
+        VmExitAnalysis of the chunk, its head and pending events are not
+        accounted, they are stitched with the ones of the neighbours
+    """
+    (ifile, start, end, bucket) = chunk
+    analysis = VmExitAnalysis(bucket, keep_head=True)
+
+    def read_lines(ifp):
+        pos = start
+        while pos < end:
+            line = ifp.readline()
+            if line == '':
+                break
+            pos += len(line)
+            yield line
+
+    with open(local_path(ifile), 'rb') as ifp:
+        ifp.seek(start)
+        analysis.feed(read_events(read_lines(ifp)))
+
+    return analysis
+
+def stitch_chunks(results):
+    """combine the results of the chunks of a trace data file
+
+    The exit crossing the boundary of two chunks is made of the tail of
+    the first one and the head of the second one, it is accounted here.
+
+    Args:
+        results: list of parse_trace_chunk() results, in file order
+    Return:
+        dict of the counters of the whole file, or None if no VM_ENTER
+    """
+    merged = None
+    carry = None
+
+    for chunk in results:
+        if chunk.tsc_begin == 0:
+            # no VM_ENTER at all in this chunk
+            if carry is not None:
+                carry.extend(chunk.head)
+            continue
+
+        if merged is None:
+            merged = chunk
+        else:
+            stitch = VmExitAnalysis(chunk.timeline_bucket)
+            stitch.feed([('VM_ENTER', tsc_enter, '')] + carry + chunk.head)
+            merged.merge(stitch)
+            merged.merge(chunk)
+
+        carry = chunk.pending
+        tsc_enter = chunk.tsc_end
+
+    if merged is None:
+        return None
+
+    return merged.to_dict()
+
+def timeline_bucket(freq, timeline):
+    """get the timeline bucket size in cycles
+    Args:
+        freq: CPU frequency, in MHz
+        timeline: bucket size in milliseconds, 0 for no timeline
+    Return:
+        bucket size in cycles
+    """
+    return long(timeline * freq * 1000)
+
+def analyze_vm_exit(ifile, ofile, jobs=1, vector=False, timeline=0,
+                    **options):
     """do the vm exits analysis
     Args:
         ifile: input trace data file
         ofile: output report file
+        jobs: number of worker processes parsing chunks of the file,
+              0 for one per host cpu
+        vector: do the vectorized analysis of raw trace data, always done
+                if NumPy is available, text trace data is parsed anyway
+        timeline: bucket size in milliseconds of the exits timeline report
+                  saved to ofile_timeline.csv, 0 for no timeline
+        options: other analysis options, not used here
     Return:
         None
     """
@@ -267,8 +711,210 @@ def analyze_vm_exit(ifile, ofile):
     print("VM exits analysis started... \n\tinput file: %s\n"
           "\toutput file: %s.csv" % (ifile, ofile))
 
-    freq = get_freq(ifile)
+    ifile = trace_cache.cached_path(ifile)
+
+    if jobs == 0:
+        jobs = cpu_count()
+
+    # compressed trace data can only be read from the beginning
+    if jobs == 1 or is_raw_trace(ifile) or is_compressed(ifile):
+        (freq, stats) = cpu_trace_stats(ifile, vector, timeline)
+    else:
+        freq = get_freq(ifile)
+        bucket = timeline_bucket(freq, timeline)
+        chunks = [(ifile, start, end, bucket) for (start, end)
+                  in split_trace_file(ifile, jobs * CHUNKS_PER_JOB)]
+        pool = Pool(processes=min(len(chunks), jobs))
+        try:
+            results = pool.map(parse_trace_chunk, chunks)
+        finally:
+            pool.close()
+            pool.join()
+        stats = stitch_chunks(results)
+
+    if stats is None or stats['run_cycles'] == 0:
+        print "Invalid trace data file %s" % (ifile)
+        return
 
-    parse_trace_data(ifile)
     # save report to the output file
-    generate_report(ofile, freq)
+    generate_report(ofile, freq, stats)
+    if timeline != 0:
+        generate_timeline_report(ofile, freq, stats)
+
+@register_analyzer
+class VmExitAnalyzer(Analyzer):
+    """vm_exit report, on the shared pass over the trace data"""
+
+    name = 'vm_exit'
+    per_cpu_report = True
+
+    def __init__(self, timeline=0, **options):
+        self.timeline = timeline
+        self.analysis = None
+
+    def begin(self, freq):
+        self.analysis = VmExitAnalysis(timeline_bucket(freq, self.timeline))
+
+    def feed(self, events):
+        self.analysis.feed(events)
+
+    def end(self):
+        # the events out of the first and the last VM_ENTER are not
+        # accounted, nor sent back from the worker processes
+        self.analysis.head = []
+        self.analysis.pending = []
+
+    def valid(self):
+        return self.analysis is not None and self.analysis.run_cycles != 0
+
+    def merge(self, other):
+        if not other.valid():
+            return
+        if not self.valid():
+            self.analysis = other.analysis
+            return
+        self.analysis.merge(other.analysis)
+
+    def report(self, ofile, freq):
+        stats = self.analysis.to_dict()
+        generate_report(ofile, freq, stats)
+        if self.timeline != 0:
+            generate_timeline_report(ofile, freq, stats)
+
+def list_trace_files(idir):
+    """list the per-cpu trace data files acrntrace created in a directory
+    Args:
+        idir: trace data directory, with one file named by cpuid per cpu,
+              or tarball of one, maybe compressed
+    Return:
+        list of (cpuid, file path) sorted by cpuid
+    """
+    if is_archive(idir):
+        return archive_members(idir)
+
+    files = []
+    for name in os.listdir(idir):
+        path = os.path.join(idir, name)
+        if name.isdigit() and os.path.isfile(path):
+            files.append((int(name), path))
+
+    return sorted(files)
+
+def map_trace_files(func, idir, make_args, jobs=0):
+    """call a function on each per-cpu trace data file of a directory
+    Args:
+        func: function called with make_args(path), may run in a worker
+              process
+        idir: trace data directory, or tarball of one, maybe compressed
+        make_args: function of the file path returning the func argument
+        jobs: number of worker processes, 0 for one per host cpu, the files
+              of a tarball read as a stream are done one after the other
+              by this process instead, as they are read
+    Return:
+        list of (cpuid, file path, func result) sorted by cpuid
+    """
+    if is_streamed(idir):
+        return sorted((cpu, path, func(make_args(path)))
+                      for (cpu, path) in stream_archive(idir))
+
+    files = list_trace_files(idir)
+    if len(files) == 0:
+        return []
+
+    if jobs == 0:
+        jobs = cpu_count()
+
+    pool = Pool(processes=min(len(files), jobs))
+    try:
+        results = pool.map(func, [make_args(path) for (cpu, path) in files])
+    finally:
+        pool.close()
+        pool.join()
+
+    return [(cpu, path, result)
+            for ((cpu, path), result) in zip(files, results)]
+
+def analyze_cpu_trace(args):
+    """analyze one per-cpu trace data file, may run in a worker process
+    Args:
+        args: tuple of (ifile, vector, timeline), vector to do the vectorized
+              analysis of raw trace data, which is always done if NumPy is
+              available, timeline the timeline bucket size in milliseconds
+    Return:
+        tuple of (cpu frequency, counters dict)
+    """
+    (ifile, vector, timeline) = args
+
+    return cpu_trace_stats(trace_cache.cached_path(ifile), vector, timeline)
+
+def cpu_trace_stats(ifile, vector, timeline):
+    """analyze one per-cpu trace data file
+    Args:
+        ifile: input trace data file, as returned by cached_path()
+        vector: do the vectorized analysis of raw trace data, which is
+                always done if NumPy is available
+        timeline: timeline bucket size in milliseconds
+    Return:
+        tuple of (cpu frequency, counters dict)
+    """
+    raw = is_raw_trace(ifile)
+    if raw and HAVE_NUMPY:
+        from vmexit_vector import vector_trace_stats
+        return vector_trace_stats(ifile, timeline)
+    if raw and vector:
+        print "--vector needs NumPy, %s is read event by event" % (ifile)
+
+    freq = get_raw_freq(ifile) if raw else get_freq(ifile)
+    analysis = VmExitAnalysis(timeline_bucket(freq, timeline))
+    if raw:
+        analysis.feed(read_raw_events(ifile))
+    else:
+        parse_trace_data(ifile, analysis)
+
+    return (freq, analysis.to_dict())
+
+def analyze_vm_exit_dir(idir, ofile, jobs=0, vector=False, timeline=0,
+                        **options):
+    """do the vm exits analysis of all the cpus in parallel
+    Args:
+        idir: input trace data directory
+        ofile: output report file, the per-cpu reports are saved to
+               ofile_cpu<cpuid>
+        jobs: number of worker processes, 0 for one per host cpu
+        vector: do the vectorized analysis of raw trace data, always done
+                if NumPy is available, text trace data is parsed anyway
+        timeline: bucket size in milliseconds of the exits timeline report
+                  saved to ofile_timeline.csv, 0 for no timeline
+        options: other analysis options, not used here
+    Return:
+        None
+    """
+    print("VM exits analysis started... \n\tinput dir: %s\n"
+          "\toutput file: %s.csv" % (idir, ofile))
+
+    results = map_trace_files(analyze_cpu_trace, idir,
+                              lambda path: (path, vector, timeline), jobs)
+    if len(results) == 0:
+        print "No trace data file in %s" % (idir)
+        return
+
+    stats_list = []
+    for (cpu, path, (freq, stats)) in results:
+        if stats is None or stats['run_cycles'] == 0:
+            print "Invalid trace data file %s" % (path)
+            continue
+
+        print "\n[CPU %d]" % (cpu)
+        generate_report("%s_cpu%d" % (ofile, cpu), freq, stats)
+        if timeline != 0:
+            generate_timeline_report("%s_cpu%d" % (ofile, cpu), freq, stats)
+        stats_list.append(stats)
+
+    if len(stats_list) == 0:
+        return
+
+    print "\n[All CPUs]"
+    stats = merge_stats(stats_list)
+    generate_report(ofile, freq, stats)
+    if timeline != 0:
+        generate_timeline_report(ofile, freq, stats)
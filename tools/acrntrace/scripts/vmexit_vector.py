@@ -0,0 +1,220 @@
+#!/usr/bin/python2
+# -*- coding: UTF-8 -*-
+
+"""
+This script defines the vectorized vm_exit analysis, the trace events are
+loaded into NumPy arrays and all the exits are accounted at once
+"""
+
+from array import array
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+import trace_event as te
+from raw_trace import load_raw_trace
+from vmexit_analyze import LIST_EVENTS, REASON_INDEX, UNKNOWN_INDEX, \
+        timeline_bucket
+from latency_hist import LatencyHistogram
+
+GVT_INDEX = REASON_INDEX['VMEXIT_EPT_VIOLATION_GVT']
+
+def exit_reasons(ids, e):
+    """map the trace event ids to exit reason indexes
+    Args:
+        ids: array of trace event ids
+        e: array of the e payload field, to tell the GVT EPT violations
+    Return:
+        array of the index in LIST_EVENTS, -1 if not an exit reason
+    """
+    reason_ids = np.array(sorted(te.EVENT_IDS[event] for event in LIST_EVENTS
+                                 if event in te.EVENT_IDS), dtype=np.uint64)
+    reason_index = np.array([REASON_INDEX[te.EVENT_NAMES[int(ev_id)]]
+                             for ev_id in reason_ids], dtype=np.int64)
+
+    pos = np.searchsorted(reason_ids, ids)
+    pos[pos == len(reason_ids)] = 0
+    reasons = np.where(reason_ids[pos] == ids, reason_index[pos], -1)
+
+    gvt = ((ids == te.TRC_VMEXIT_EPT_VIOLATION)
+           & ((e & np.uint64(0x38)) == np.uint64(0x28)))
+    reasons[gvt] = GVT_INDEX
+
+    return reasons
+
+def exit_durations(records):
+    """pair each exit with the VM_ENTER closing it
+    Args:
+        records: trace records, as loaded by load_raw_trace()
+    Return:
+        dict of arrays, or None if there is no complete exit:
+        records: the records trimmed to the first and the last VM_ENTER
+        reasons: the exit reason index of each record, -1 if none
+        exit_reason: the last exit reason index of each exit, UNKNOWN_INDEX
+                     if it has a VM_EXIT but no exit reason, -1 if neither
+        exit_tsc: the tsc each exit starts at
+        enter_tsc: the tsc of the VM_ENTERs, one more than the exits
+        durations: the cycles in each exit
+    """
+    ids = records['id']
+    enters = np.flatnonzero(ids == te.TRACE_VM_ENTER)
+    if len(enters) < 2:
+        return None
+
+    records = records[enters[0]:enters[-1] + 1]
+    ids = records['id']
+    tsc = records['tsc'].astype(np.int64)
+
+    is_enter = ids == te.TRACE_VM_ENTER
+    # the exit index of each record, each VM_ENTER closes one exit
+    seg = np.cumsum(is_enter) - 1
+    enter_tsc = tsc[is_enter]
+    nr_segs = len(enter_tsc) - 1
+
+    # the exit starts at its latest VM_EXIT, at the previous VM_ENTER if
+    # the VM_EXIT is lost; on repeated indexes the last value is assigned
+    exit_tsc = enter_tsc[:-1].copy()
+    is_exit = ids == te.TRACE_VM_EXIT
+    exit_tsc[seg[is_exit]] = tsc[is_exit]
+
+    reasons = exit_reasons(ids, records['e'])
+    is_reason = reasons >= 0
+    seg_reason = np.full(nr_segs, -1, dtype=np.int64)
+    seg_reason[seg[is_reason]] = reasons[is_reason]
+    has_exit = np.zeros(nr_segs, dtype=bool)
+    has_exit[seg[is_exit]] = True
+    seg_reason[has_exit & (seg_reason < 0)] = UNKNOWN_INDEX
+
+    return {
+        'records': records,
+        'reasons': reasons,
+        'exit_reason': seg_reason,
+        'exit_tsc': exit_tsc,
+        'enter_tsc': enter_tsc,
+        'durations': enter_tsc[1:] - exit_tsc
+    }
+
+def exit_timeline(paired, bucket):
+    """bucket the exits over time
+    Args:
+        paired: dict returned by exit_durations()
+        bucket: bucket size in cycles
+    Return:
+        dict of bucket index to array of the number of exits by reason
+        followed by the cycles in exit by reason, as in vmexit_analyze
+    """
+    nr_events = len(LIST_EVENTS)
+    valid = paired['exit_reason'] >= 0
+    reasons = paired['exit_reason'][valid]
+    buckets = paired['exit_tsc'][valid] // bucket
+    durations = paired['durations'][valid]
+
+    if len(buckets) == 0:
+        return {}
+
+    first = buckets.min()
+    cells = (buckets - first) * nr_events + reasons
+    size = (buckets.max() - first + 1) * nr_events
+    counts = np.bincount(cells, minlength=size).reshape(-1, nr_events)
+    cycles = np.bincount(cells, weights=durations,
+                         minlength=size).reshape(-1, nr_events)
+
+    timeline = {}
+    for row in np.flatnonzero(counts.sum(axis=1)):
+        timeline[long(first + row)] = array('L',
+            [int(v) for v in counts[row]] + [long(round(v)) for v in cycles[row]])
+
+    return timeline
+
+def exit_stats(records, bucket=0):
+    """do the vm exits analysis over trace records
+    Args:
+        records: trace records
+        bucket: timeline bucket size in cycles, 0 for no timeline
+    Return:
+        dict of the counters, same as VmExitAnalysis.to_dict(), or None
+        if there is no complete exit
+    """
+    paired = exit_durations(records)
+    if paired is None:
+        return None
+
+    records = paired['records']
+    reasons = paired['reasons']
+    seg_reason = paired['exit_reason']
+    durations = paired['durations']
+    enter_tsc = paired['enter_tsc']
+    ids = records['id']
+    nr_events = len(LIST_EVENTS)
+
+    counts = np.bincount(reasons[reasons >= 0], minlength=nr_events)
+    counts[UNKNOWN_INDEX] = np.count_nonzero(seg_reason == UNKNOWN_INDEX)
+    valid = seg_reason >= 0
+    # float64 accumulation is exact as long as the total stays below 2^53
+    cycles = np.bincount(seg_reason[valid], weights=durations[valid],
+                         minlength=nr_events)
+
+    nr_exits = {}
+    time_in_exit = {}
+    latency = {}
+    for (idx, event) in enumerate(LIST_EVENTS):
+        nr_exits[event] = int(counts[idx])
+        time_in_exit[event] = long(round(cycles[idx]))
+        latency[event] = LatencyHistogram()
+        latency[event].record_array(durations[seg_reason == idx])
+
+    irq_exits = {}
+    is_exception = ids == te.TRC_VMEXIT_EXCEPTION_OR_NMI
+    is_interrupt = ids == te.TRC_VMEXIT_EXTERNAL_INTERRUPT
+    vectors = np.concatenate((records['a'][is_exception].astype(np.uint64),
+                              records['e'][is_interrupt]))
+    if len(vectors) > 0:
+        (vecs, vec_counts) = np.unique(vectors, return_counts=True)
+        for (vec, count) in zip(vecs, vec_counts):
+            irq_exits['0x%08x' % int(vec)] = int(count)
+
+    tsc_begin = long(enter_tsc[0])
+    tsc_end = long(enter_tsc[-1])
+
+    return {
+        'tsc_begin': tsc_begin,
+        'tsc_end': tsc_end,
+        'run_cycles': tsc_end - tsc_begin,
+        'total_nr_exits': long(np.count_nonzero(ids == te.TRACE_VM_EXIT)),
+        'nr_exits': nr_exits,
+        'time_in_exit': time_in_exit,
+        'irq_exits': irq_exits,
+        'latency': latency,
+        'timeline_bucket': bucket,
+        'timeline': exit_timeline(paired, bucket) if bucket != 0 else {}
+    }
+
+def load_trace(ifile):
+    """load a raw trace data file into trace records
+    Args:
+        ifile: input raw trace data file
+    Return:
+        tuple of (cpu frequency, records)
+    Raises:
+        ImportError if NumPy is not available, ValueError on a bad header
+    """
+    if np is None:
+        raise ImportError("NumPy is required by the vectorized analysis")
+
+    (cpuid, freq, records) = load_raw_trace(ifile)
+
+    return (freq, records)
+
+def vector_trace_stats(ifile, timeline=0):
+    """do the vectorized vm exits analysis of a raw trace data file
+    Args:
+        ifile: input raw trace data file
+        timeline: timeline bucket size in milliseconds, 0 for no timeline
+    Return:
+        tuple of (cpu frequency, counters dict or None)
+    """
+    (freq, records) = load_trace(ifile)
+
+    return (freq, exit_stats(records, timeline_bucket(freq, timeline)))